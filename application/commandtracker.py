@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+#   Simple IOT demo in Linux
+#   Copyright (C) 2019  Jeune Prime M. Origines <primeyo2004@yahoo.com>
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import collections
+import time
+
+
+class CommandTracker:
+    # commands published to the actuators and not confirmed yet by their
+    # current_state event, per actuator. A command equal to the pending one
+    # isn't published again until it times out, a token bucket limits the
+    # rate of all the commands. The command to confirmation latencies of
+    # the last max_latencies confirmed commands are kept.
+    def __init__(self, timeout=10.0, rate=5.0, burst=10, max_latencies=1000):
+        self.Timeout      = timeout
+        self.Rate         = rate
+        self.Burst        = burst
+        self.Sent         = 0
+        self.Deduplicated = 0
+        self.RateLimited  = 0
+        self.TimedOut     = 0
+        self.Confirmed    = 0
+        self.__pending    = {}
+        self.__tokens     = float(burst)
+        self.__lastRefill = time.monotonic()
+        self.__latencies  = collections.deque(maxlen=max_latencies)
+
+    def Pending(self, actuatorType, actuatorId):
+        # state of the pending command of the actuator or None
+        pending = self.__pending.get((actuatorType, actuatorId))
+        return pending[0] if pending is not None else None
+
+    def Request(self, actuatorType, actuatorId, state, now=None):
+        # True when the command is to be published now, it is then pending
+        if now is None:
+            now = time.monotonic()
+        key = (actuatorType, actuatorId)
+        pending = self.__pending.get(key)
+        if pending is not None:
+            if now - pending[1] >= self.Timeout:
+                self.TimedOut = self.TimedOut + 1
+                print('Command %s to %s not confirmed in %d seconds' % (pending[0], actuatorId, self.Timeout))
+                del self.__pending[key]
+            elif pending[0] == state:
+                self.Deduplicated = self.Deduplicated + 1
+                return False
+
+        self.__tokens = min(self.__tokens + (now - self.__lastRefill) * self.Rate, self.Burst)
+        self.__lastRefill = now
+        if self.__tokens < 1:
+            self.RateLimited = self.RateLimited + 1
+            return False
+        self.__tokens = self.__tokens - 1
+        self.__pending[key] = (state, now)
+        self.Sent = self.Sent + 1
+        return True
+
+    def Confirm(self, actuatorType, actuatorId, state, now=None):
+        # current_state reported by the actuator, returns the latency of the
+        # command it confirms or None
+        if now is None:
+            now = time.monotonic()
+        key = (actuatorType, actuatorId)
+        pending = self.__pending.get(key)
+        if pending is None or pending[0] != state:
+            return None
+        del self.__pending[key]
+        latency = now - pending[1]
+        self.__latencies.append(latency)
+        self.Confirmed = self.Confirmed + 1
+        return latency
+
+    def Latencies(self):
+        # (count, mean, median, 95th percentile, max) of the latencies
+        latencies = sorted(self.__latencies)
+        if len(latencies) == 0:
+            return (0, None, None, None, None)
+        count = len(latencies)
+        return (count, sum(latencies) / count, latencies[count // 2],
+                latencies[min(count - 1, int(count * 0.95))], latencies[-1])
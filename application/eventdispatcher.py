@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+#   Simple IOT demo in Linux
+#   Copyright (C) 2019  Jeune Prime M. Origines <primeyo2004@yahoo.com>
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import queue
+import threading
+import zlib
+
+
+class EventShard(threading.Thread):
+    # worker of one shard, runs the queued callbacks in order
+    def __init__(self, index, queue_size):
+        threading.Thread.__init__(self, name='events-%d' % index, daemon=True)
+        self.Index     = index
+        self.Queue     = queue.Queue(queue_size)
+        self.Processed = 0
+        self.Failed    = 0
+        self.Blocked   = 0
+        self.Dropped   = 0
+        self.MaxDepth  = 0
+
+    def run(self):
+        while True:
+            item = self.Queue.get()
+            if item is None:
+                return
+            callback, args = item
+            try:
+                callback(*args)
+            except Exception as ex:
+                self.Failed = self.Failed + 1
+                print('Failed to process event in %s: %s' % (self.name, ex))
+            self.Processed = self.Processed + 1
+
+
+class EventDispatcher:
+    # runs the processing of the device events on a pool of worker threads,
+    # the events are sharded by (deviceType, deviceId) so that the events of
+    # a device are processed in order. The queues are bounded, when a queue
+    # is full the dispatching thread waits (block=True), which holds back
+    # the MQTT client, or the event is dropped.
+    def __init__(self, workers=4, queue_size=1000, block=True):
+        self.Block  = block
+        self.Shards = [EventShard(index, queue_size) for index in range(workers)]
+
+    def Start(self):
+        for shard in self.Shards:
+            shard.start()
+
+    def Stop(self):
+        # processes the queued events before returning
+        for shard in self.Shards:
+            shard.Queue.put(None)
+        for shard in self.Shards:
+            shard.join()
+
+    def Shard(self, key):
+        deviceType, deviceId = key
+        return zlib.crc32(('%s/%s' % (deviceType, deviceId)).encode('utf-8')) % len(self.Shards)
+
+    def Dispatch(self, key, callback, *args):
+        return self.DispatchTo(self.Shard(key), callback, *args)
+
+    def DispatchTo(self, index, callback, *args):
+        shard = self.Shards[index]
+        try:
+            shard.Queue.put_nowait((callback, args))
+        except queue.Full:
+            if not self.Block:
+                shard.Dropped = shard.Dropped + 1
+                return False
+            shard.Blocked = shard.Blocked + 1
+            shard.Queue.put((callback, args))
+        shard.MaxDepth = max(shard.MaxDepth, shard.Queue.qsize())
+        return True
+
+    def Stats(self):
+        # (queue depth, max depth, processed, failed, blocked, dropped) per shard
+        return [(shard.Queue.qsize(), shard.MaxDepth, shard.Processed, shard.Failed, shard.Blocked, shard.Dropped)
+                for shard in self.Shards]
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+#   Simple IOT demo in Linux
+#   Copyright (C) 2019  Jeune Prime M. Origines <primeyo2004@yahoo.com>
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import math
+import mmap
+import os
+import struct
+import threading
+
+
+HISTORY_MAGIC  = b'HIST'
+HISTORY_HEADER = struct.Struct('<4sIIQ')
+HISTORY_HEADER_SIZE = 24
+
+RESOLUTION_RAW    = 0
+RESOLUTION_MINUTE = 60
+RESOLUTION_HOUR   = 3600
+
+# columns of the rollup rings
+ROLLUP_START = 0
+ROLLUP_MIN   = 1
+ROLLUP_MAX   = 2
+ROLLUP_SUM   = 3
+ROLLUP_COUNT = 4
+
+
+class MmapRing:
+    # fixed capacity ring of rows of doubles in a memory-mapped file, the
+    # columns are stored one after the other. Rows are addressed oldest
+    # first, the first column is the time and must not decrease.
+    def __init__(self, path, capacity, columns):
+        self.Path     = path
+        self.Capacity = capacity
+        size = HISTORY_HEADER_SIZE + capacity * columns * 8
+        valid = os.path.exists(path) and os.path.getsize(path) == size
+        with open(path, 'a+b') as f:
+            if not valid:
+                f.truncate(0)
+                f.truncate(size)
+            self.__map = mmap.mmap(f.fileno(), size)
+        magic, fileCapacity, fileColumns, count = HISTORY_HEADER.unpack_from(self.__map)
+        if magic != HISTORY_MAGIC or fileCapacity != capacity or fileColumns != columns:
+            count = 0
+            HISTORY_HEADER.pack_into(self.__map, 0, HISTORY_MAGIC, capacity, columns, 0)
+        self.Count  = count
+        self.__view = memoryview(self.__map)[HISTORY_HEADER_SIZE:].cast('d')
+        self.Columns = [self.__view[c * capacity:(c + 1) * capacity] for c in range(columns)]
+
+    def __len__(self):
+        return min(self.Count, self.Capacity)
+
+    def __Index(self, i):
+        return (self.Count - len(self) + i) % self.Capacity
+
+    def Append(self, row):
+        index = self.Count % self.Capacity
+        for column, value in zip(self.Columns, row):
+            column[index] = value
+        self.Count = self.Count + 1
+        struct.pack_into('<Q', self.__map, 12, self.Count)
+
+    def Get(self, i, column):
+        return self.Columns[column][self.__Index(i)]
+
+    def Set(self, i, column, value):
+        self.Columns[column][self.__Index(i)] = value
+
+    def Row(self, i):
+        index = self.__Index(i)
+        return tuple(column[index] for column in self.Columns)
+
+    def Search(self, t):
+        # first row whose time is not lower than t
+        low, high = 0, len(self)
+        times = self.Columns[0]
+        while low < high:
+            middle = (low + high) // 2
+            if times[self.__Index(middle)] < t:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def Oldest(self):
+        return self.Get(0, 0) if len(self) > 0 else None
+
+    def Sync(self):
+        self.__map.flush()
+
+    def Close(self):
+        self.Columns = []
+        self.__view.release()
+        self.__map.close()
+
+
+class DeviceHistory:
+    # history of one value of a device: the raw readings and their 1 minute
+    # and 1 hour rollups (min, max, sum, count), each one in a ring of its
+    # own so the disk use is fixed by the capacities. A reading older than
+    # the last one is counted in Late and kept out of every ring, the
+    # rollups always summarize the raw readings.
+    def __init__(self, path, raw_capacity, minute_capacity, hour_capacity):
+        self.Lock   = threading.Lock()
+        self.Late   = 0
+        self.Raw    = MmapRing(path + '.raw', raw_capacity, 2)
+        self.Minute = MmapRing(path + '.1m', minute_capacity, 5)
+        self.Hour   = MmapRing(path + '.1h', hour_capacity, 5)
+
+    def Append(self, timestamp, value):
+        with self.Lock:
+            if len(self.Raw) > 0 and timestamp < self.Raw.Get(len(self.Raw) - 1, 0):
+                self.Late = self.Late + 1
+                return
+            self.Raw.Append((timestamp, value))
+            self.__Rollup(self.Minute, RESOLUTION_MINUTE, timestamp, value)
+            self.__Rollup(self.Hour, RESOLUTION_HOUR, timestamp, value)
+
+    def __Rollup(self, ring, resolution, timestamp, value):
+        start = math.floor(timestamp / resolution) * resolution
+        last = len(ring) - 1
+        if last < 0 or start > ring.Get(last, ROLLUP_START):
+            ring.Append((start, value, value, value, 1))
+            return
+        # the readings are in order, only the open bucket is updated
+        ring.Set(last, ROLLUP_MIN, min(ring.Get(last, ROLLUP_MIN), value))
+        ring.Set(last, ROLLUP_MAX, max(ring.Get(last, ROLLUP_MAX), value))
+        ring.Set(last, ROLLUP_SUM, ring.Get(last, ROLLUP_SUM) + value)
+        ring.Set(last, ROLLUP_COUNT, ring.Get(last, ROLLUP_COUNT) + 1)
+
+    def Resolution(self, start, resolution=None):
+        # the coarsest resolution not coarser than requested which still
+        # holds the start of the range, else the finest coarser one which does
+        levels = [(RESOLUTION_RAW, self.Raw), (RESOLUTION_MINUTE, self.Minute), (RESOLUTION_HOUR, self.Hour)]
+        if resolution is None:
+            resolution = RESOLUTION_RAW
+        candidates = [level for level in reversed(levels) if level[0] <= resolution] + \
+                [level for level in levels if level[0] > resolution]
+        for candidateResolution, ring in candidates:
+            oldest = ring.Oldest()
+            if oldest is not None and oldest <= start:
+                return candidateResolution
+        return RESOLUTION_HOUR
+
+    def Query(self, start, end, resolution=None):
+        # (time, min, max, mean, count) of the range [start, end), resolution
+        # is the wanted spacing of the points in seconds, None for the finest
+        with self.Lock:
+            resolution = self.Resolution(start, resolution)
+            rows = []
+            if resolution == RESOLUTION_RAW:
+                for i in range(self.Raw.Search(start), len(self.Raw)):
+                    timestamp, value = self.Raw.Row(i)
+                    if timestamp >= end:
+                        break
+                    rows.append((timestamp, value, value, value, 1))
+                return resolution, rows
+            ring = self.Minute if resolution == RESOLUTION_MINUTE else self.Hour
+            for i in range(ring.Search(math.floor(start / resolution) * resolution), len(ring)):
+                bucket, low, high, total, count = ring.Row(i)
+                if bucket >= end:
+                    break
+                rows.append((bucket, low, high, total / count, int(count)))
+            return resolution, rows
+
+    def Sync(self):
+        with self.Lock:
+            for ring in [self.Raw, self.Minute, self.Hour]:
+                ring.Sync()
+
+    def Close(self):
+        with self.Lock:
+            for ring in [self.Raw, self.Minute, self.Hour]:
+                ring.Close()
+
+
+class HistoryStore:
+    # embedded append-only store of the readings, one DeviceHistory per
+    # (deviceType, deviceId, field) under directory/deviceType/deviceId/
+    def __init__(self, directory, raw_capacity=8192, minute_capacity=2880, hour_capacity=8760):
+        self.Directory      = directory
+        self.RawCapacity    = raw_capacity
+        self.MinuteCapacity = minute_capacity
+        self.HourCapacity   = hour_capacity
+        self.__lock    = threading.Lock()
+        self.__streams = {}
+
+    def StreamBytes(self):
+        # disk use of every stream
+        return 3 * HISTORY_HEADER_SIZE + 8 * (2 * self.RawCapacity + 5 * (self.MinuteCapacity + self.HourCapacity))
+
+    def __Name(self, name):
+        return str(name).replace(os.sep, '_')
+
+    def __Path(self, deviceType, deviceId, field):
+        return os.path.join(self.Directory, self.__Name(deviceType), self.__Name(deviceId), self.__Name(field))
+
+    def Stream(self, deviceType, deviceId, field, create=True):
+        # None for a stream without files when create is False
+        key = (deviceType, deviceId, field)
+        stream = self.__streams.get(key)
+        if stream is None:
+            with self.__lock:
+                stream = self.__streams.get(key)
+                if stream is None:
+                    path = self.__Path(deviceType, deviceId, field)
+                    if not create and not os.path.exists(path + '.raw'):
+                        return None
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    stream = DeviceHistory(path, self.RawCapacity, self.MinuteCapacity, self.HourCapacity)
+                    self.__streams[key] = stream
+        return stream
+
+    def Append(self, deviceType, deviceId, field, timestamp, value):
+        self.Stream(deviceType, deviceId, field).Append(timestamp, value)
+
+    def Query(self, deviceType, deviceId, field, start, end, resolution=None):
+        # (resolution, rows) see DeviceHistory.Query, no rows of an unknown stream
+        stream = self.Stream(deviceType, deviceId, field, create=False)
+        if stream is None:
+            return (RESOLUTION_RAW if resolution is None else resolution), []
+        return stream.Query(start, end, resolution)
+
+    def Sync(self):
+        # also meant as main loop timeout callback
+        with self.__lock:
+            streams = list(self.__streams.values())
+        for stream in streams:
+            stream.Sync()
+        return True
+
+    def Close(self):
+        with self.__lock:
+            for stream in self.__streams.values():
+                stream.Close()
+            self.__streams.clear()
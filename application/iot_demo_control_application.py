@@ -18,10 +18,17 @@
 #
 
 import sys
+import threading
 import time
 import uuid
 import json
 import ibmiotf.application
+import commandtracker
+import eventdispatcher
+import historystore
+import payloadcodec
+import ruleengine
+import streamstats
 
 try:
   from gi.repository import GObject
@@ -49,27 +56,97 @@ class SimpleControlApplicationImpl:
     IOT_DEVICE_ACTUATOR_TYPE = "DEMOACTUATOR_T"
     IOT_DEVICE_ACTUATOR_ID   = "ITAG_ALARM_1"
     IOT_EVENT_READING        = "reading"
+    IOT_EVENT_READINGS       = "readings"
     IOT_EVENT_CURRENT_STATE  = "current_state"
     IOT_CMD_NEW_STATE        = "new_state"
 
     TEMPERATURE_THRESHOLD_1  = 40 
     TEMPERATURE_THRESHOLD_2  = 45 
+    TEMPERATURE_HYSTERESIS   = 1
+    # rate of change alarm thresholds in degrees per minute
+    TEMPERATURE_RATE_1       = 2
+    TEMPERATURE_RATE_2       = 5
+    TEMPERATURE_RATE_HYSTERESIS = 0.5
+
+    # window of the streaming statistics of every sensor, samples and seconds
+    STATS_WINDOW_SAMPLES     = 20
+    STATS_WINDOW_AGE         = 120
+    STATS_EWMA_ALPHA         = 0.3
+
+    # a command not confirmed by the actuator within the timeout (seconds) is
+    # sent again, at most COMMAND_RATE commands per second in bursts of COMMAND_BURST
+    COMMAND_TIMEOUT          = 10
+    COMMAND_RATE             = 5
+    COMMAND_BURST            = 10
+
+    # the events are processed by EVENT_WORKERS threads sharded by device, when
+    # the queue of a worker is full the MQTT client waits, or the event is
+    # dropped when EVENT_QUEUE_BLOCK is False
+    EVENT_WORKERS            = 4
+    EVENT_QUEUE_SIZE         = 1000
+    EVENT_QUEUE_BLOCK        = True
+
+    # history of the readings with 1 minute and 1 hour rollups, the ring
+    # capacities fix the disk use per sensor, set HISTORY_DIR to None to disable
+    HISTORY_DIR              = './iot_demo_history'
+    HISTORY_RAW_CAPACITY     = 8192
+    HISTORY_MINUTE_CAPACITY  = 2880
+    HISTORY_HOUR_CAPACITY    = 8760
+    HISTORY_SYNC_INTERVAL    = 5000
+
+    # (sensor type, sensor id, actuator type, actuator id, thresholds, hysteresis, statistic)
+    # of the alarm rules, the statistic is one of streamstats.STAT_*. A sensor
+    # has one rule per statistic, an actuator may have many sensors
+    ALARM_RULES = [(IOT_DEVICE_SENSOR_TYPE, IOT_DEVICE_SENSOR_ID, IOT_DEVICE_ACTUATOR_TYPE, IOT_DEVICE_ACTUATOR_ID,
+                    (TEMPERATURE_THRESHOLD_1, TEMPERATURE_THRESHOLD_2), TEMPERATURE_HYSTERESIS, streamstats.STAT_EWMA),
+                   (IOT_DEVICE_SENSOR_TYPE, IOT_DEVICE_SENSOR_ID, IOT_DEVICE_ACTUATOR_TYPE, IOT_DEVICE_ACTUATOR_ID,
+                    (TEMPERATURE_RATE_1, TEMPERATURE_RATE_2), TEMPERATURE_RATE_HYSTERESIS, streamstats.STAT_SLOPE)]
 
 
     def __init__(self, iotApp):
         self.iotApp  = iotApp 
         self.eventMsgId  = None
         self.statusMsgId = None 
+        self.ruleEngine  = ruleengine.RuleEngine()
+        self.streamStats = streamstats.StreamStats(self.STATS_WINDOW_SAMPLES, self.STATS_WINDOW_AGE, self.STATS_EWMA_ALPHA)
+        self.commandTracker = commandtracker.CommandTracker(self.COMMAND_TIMEOUT, self.COMMAND_RATE, self.COMMAND_BURST)
+        self.historyStore = None
+        if self.HISTORY_DIR is not None:
+            self.historyStore = historystore.HistoryStore(self.HISTORY_DIR, self.HISTORY_RAW_CAPACITY,
+                    self.HISTORY_MINUTE_CAPACITY, self.HISTORY_HOUR_CAPACITY)
+        # the rules and the commands are shared by the workers, the stream
+        # windows are not as a device is always processed by the same worker
+        self.stateLock   = threading.Lock()
+        self.eventDispatcher = eventdispatcher.EventDispatcher(self.EVENT_WORKERS, self.EVENT_QUEUE_SIZE,
+                self.EVENT_QUEUE_BLOCK)
+        for rule in self.ALARM_RULES:
+            self.ruleEngine.AddRule(*rule)
   
 
     def Start(self):
+        self.eventDispatcher.Start()
+        if self.historyStore is not None:
+            GObject.timeout_add(self.HISTORY_SYNC_INTERVAL, self.historyStore.Sync)
         self.iotApp.deviceEventCallback  = self.__EventHandler
         self.iotApp.deviceStatusCallback = self.__StatusHandler
         self.iotApp.subscriptionCallback = self.__SubscribeCallback
 
         self.eventMsgId  = self.iotApp.subscribeToDeviceEvents(self.IOT_DEVICETYPE_ANY, self.IOT_DEVICEID_ANY, self.IOT_EVENT_ANY) 
         self.statusMsgId = self.iotApp.subscribeToDeviceStatus(self.IOT_DEVICETYPE_ANY, self.IOT_DEVICEID_ANY)
-        self.currentAlarmState = 0
+
+    def Stop(self):
+        self.eventDispatcher.Stop()
+        if self.historyStore is not None:
+            self.historyStore.Close()
+        for index, stats in enumerate(self.eventDispatcher.Stats()):
+            print('Event worker %d depth: %d, max depth: %d, processed: %d, failed: %d, blocked: %d, dropped: %d' %
+                    ((index,) + stats))
+        tracker = self.commandTracker
+        print('Commands sent: %d, deduplicated: %d, rate limited: %d, timed out: %d, confirmed: %d' %
+                (tracker.Sent, tracker.Deduplicated, tracker.RateLimited, tracker.TimedOut, tracker.Confirmed))
+        count, mean, median, p95, maximum = tracker.Latencies()
+        if count > 0:
+            print('Command latency mean: %.3fs median: %.3fs 95%%: %.3fs max: %.3fs' % (mean, median, p95, maximum))
   
 
     def __SubscribeCallback(self, msgId, qos):
@@ -79,37 +156,106 @@ class SimpleControlApplicationImpl:
             print("<< Subscription established for event messages at qos %s >> " % qos[0])
         
     def __EventHandler(self, event):
+        # called by the MQTT client thread, only dispatches the event
+        if event.event == self.IOT_EVENT_READINGS and not self.__IsReadingsBatch(event.data):
+            print('Skipping malformed readings event of', event.device)
+            return
+        if event.event == self.IOT_EVENT_READINGS and event.data['deviceType'] == self.IOT_DEVICE_SENSOR_TYPE:
+            # readings batched by the gateway, split by the worker of their device
+            shards = {}
+            for index, deviceId in enumerate(event.data['deviceId']):
+                shard = self.eventDispatcher.Shard((event.data['deviceType'], deviceId))
+                shards.setdefault(shard, []).append(index)
+            for shard, indexes in shards.items():
+                self.eventDispatcher.DispatchTo(shard, self.__ReadingsEventHandler, event, indexes)
+            return
+        self.eventDispatcher.Dispatch((event.deviceType, event.deviceId), self.__DeviceEventHandler, event)
+
+    def __IsReadingsBatch(self, data):
+        # columns of equal length as published by the gateway eventbatcher
+        if not isinstance(data, dict) or not isinstance(data.get('deviceType'), str) \
+                or not isinstance(data.get('deviceId'), list):
+            return False
+        columns = ['timestamp']
+        if data['deviceType'] == self.IOT_DEVICE_SENSOR_TYPE:
+            columns.append('temperature')
+        for name in columns:
+            values = data.get(name)
+            if not isinstance(values, list) or len(values) != len(data['deviceId']):
+                return False
+        return all(self.__IsTime(timestamp) for timestamp in data['timestamp'])
+
+    def __IsTime(self, value):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+    def __ReadingTime(self, event):
+        # sample time set by the gateway, the readings queued while it was
+        # offline are replayed long after it
+        timestamp = event.data.get('timestamp')
+        if self.__IsTime(timestamp):
+            return timestamp
+        return event.timestamp.timestamp()
+
+    def __DeviceEventHandler(self, event):
         print("%-33s%-30s%s" % (event.timestamp.isoformat(), event.device, event.event + ": " + json.dumps(event.data)))
-        if event.deviceType == self.IOT_DEVICE_SENSOR_TYPE and event.deviceId == self.IOT_DEVICE_SENSOR_ID and event.event == self.IOT_EVENT_READING:
+        if event.deviceType == self.IOT_DEVICE_SENSOR_TYPE and event.event == self.IOT_EVENT_READING:
             temperature = event.data['temperature']
-            self.__TemperatureEventHandler(temperature)
-        
-        if event.deviceType == self.IOT_DEVICE_ACTUATOR_TYPE and event.deviceId == self.IOT_DEVICE_ACTUATOR_ID and event.event == self.IOT_EVENT_CURRENT_STATE:
+            self.__TemperatureEventHandler(event.deviceType, [event.deviceId], [temperature],
+                    [self.__ReadingTime(event)])
+
+        if event.deviceType == self.IOT_DEVICE_ACTUATOR_TYPE and event.event == self.IOT_EVENT_CURRENT_STATE:
             alarm = event.data['alarm']
-            print("Received alarm current state: ", alarm)
-            self.currentAlarmState = alarm
+            print("Received alarm current state: ", alarm, 'of', event.deviceId)
+            with self.stateLock:
+                self.ruleEngine.SetActuatorState(event.deviceType, event.deviceId, alarm)
+                latency = self.commandTracker.Confirm(event.deviceType, event.deviceId, alarm)
+            if latency is not None:
+                print("Alarm state %s of %s confirmed in %.3f seconds" % (alarm, event.deviceId, latency))
+
+    def __ReadingsEventHandler(self, event, indexes):
+        # the readings of the batch processed by this worker, in columns
+        data = {}
+        for name, values in event.data.items():
+            data[name] = [values[index] for index in indexes] if isinstance(values, list) else values
+        print("%-33s%-30s%s" % (event.timestamp.isoformat(), event.device, event.event + ": " + json.dumps(data)))
+        self.__TemperatureEventHandler(data['deviceType'], data['deviceId'], data['temperature'], data['timestamp'])
  
         
+    def History(self, deviceType, deviceId, start, end, resolution=None):
+        # (resolution, [(time, min, max, mean, count)]) of the temperature
+        # readings of a sensor in [start, end), see historystore
+        if self.historyStore is None:
+            return None
+        return self.historyStore.Query(deviceType, deviceId, 'temperature', start, end, resolution)
+
     def __StatusHandler(self, status):
         if status.action == "Disconnect":
             summaryText = "%s %s (%s)" % (status.action, status.clientAddr, status.reason)
         else:
             summaryText = "%s %s" % (status.action, status.clientAddr)
 
-    def __TemperatureEventHandler(self,temperature):
-        print("Received temperature reading: ", temperature)
-        desiredAlarmState = 0
-        if temperature > self.TEMPERATURE_THRESHOLD_2:
-            desiredAlarmState = 2
-        elif temperature > self.TEMPERATURE_THRESHOLD_1:
-            desiredAlarmState = 1
-        else:
-            desiredAlarmState = 0
-
-        if self.currentAlarmState != desiredAlarmState:
+    def __TemperatureEventHandler(self, sensorType, sensorIds, temperatures, timestamps):
+        print("Received temperature readings: ", temperatures)
+        windows = []
+        for sensorId, temperature, timestamp in zip(sensorIds, temperatures, timestamps):
+            if temperature is None:
+                windows.append(None)
+                continue
+            windows.append(self.streamStats.Add(sensorType, sensorId, temperature, timestamp))
+            if self.historyStore is not None:
+                self.historyStore.Append(sensorType, sensorId, 'temperature', timestamp, temperature)
+
+        commands = []
+        with self.stateLock:
+            for transition in self.ruleEngine.Evaluate(sensorType, sensorIds, temperatures, windows):
+                # the command may still be on its way, or over the rate limit
+                if self.commandTracker.Request(*transition):
+                    commands.append(transition)
+
+        for actuatorType, actuatorId, desiredAlarmState in commands:
             newStateData = {'alarm': desiredAlarmState }
-            print("Publishing new alarm state: " , desiredAlarmState)
-            self.iotApp.publishCommand(self.IOT_DEVICE_ACTUATOR_TYPE,self.IOT_DEVICE_ACTUATOR_ID,self.IOT_CMD_NEW_STATE,"json",newStateData)
+            print("Publishing new alarm state: " , desiredAlarmState, 'to', actuatorId)
+            self.iotApp.publishCommand(actuatorType,actuatorId,self.IOT_CMD_NEW_STATE,"json",newStateData)
 
  
  
@@ -138,6 +284,7 @@ def main():
             # use ./iot_demo_control_application.cfg for client connection parameters
             iotAppOptions = ibmiotf.application.ParseConfigFile('./iot_demo_control_application.cfg')
             iotApp        = ibmiotf.application.Client(iotAppOptions)
+            payloadcodec.register_codecs(iotApp)
             iotApp.connect()
     except Exception as e:
             print("Caught exception connecting device: %s" % str(e))
@@ -153,7 +300,9 @@ def main():
     except KeyboardInterrupt:
         mainloop.quit()
 
+    # no more event callbacks once disconnected, then the workers drain their queues
     iotApp.disconnect()
+    appImpl.Stop()
     print('Exiting demo control application...')
 
 if __name__ == '__main__':
@@ -0,0 +1 @@
+../gateway/payloadcodec.py
\ No newline at end of file
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+#   Simple IOT demo in Linux
+#   Copyright (C) 2019  Jeune Prime M. Origines <primeyo2004@yahoo.com>
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import streamstats
+
+import array
+
+
+class RuleEngine:
+    # alarm rules of the sensors in array-backed tables, one row per rule
+    # with its thresholds (levels per row), hysteresis, the actuator it
+    # drives and its current alarm level. A rule compares either the
+    # reading itself or a statistic of the sensor's stream window (see
+    # streamstats), a sensor has one rule per statistic. The actuators have
+    # a table of their own with the confirmed state (reported by the
+    # gateway) and the number of their rules at every level, the desired
+    # state of an actuator is the highest level of its rules.
+    def __init__(self, levels=2):
+        self.Levels      = levels
+        self.__rows      = {}
+        self.__sensorRows = {}
+        self.__statistic = []
+        self.__thresholds = array.array('d')
+        self.__hysteresis = array.array('d')
+        self.__target    = array.array('l')
+        self.__level     = array.array('b')
+        self.__actuators = []
+        self.__actuatorRows = {}
+        self.__state     = array.array('b')
+        self.__counts    = array.array('l')
+
+    def __ActuatorRow(self, actuatorType, actuatorId):
+        key = (actuatorType, actuatorId)
+        row = self.__actuatorRows.get(key)
+        if row is None:
+            row = len(self.__actuators)
+            self.__actuatorRows[key] = row
+            self.__actuators.append(key)
+            self.__state.append(0)
+            self.__counts.extend([0] * (self.Levels + 1))
+        return row
+
+    def AddRule(self, sensorType, sensorId, actuatorType, actuatorId, thresholds, hysteresis=0.0,
+            statistic=streamstats.STAT_VALUE):
+        # thresholds in ascending order, a value above thresholds[n - 1]
+        # raises level n, falling back needs the value hysteresis lower
+        if len(thresholds) != self.Levels:
+            raise ValueError('%d thresholds expected' % self.Levels)
+        target = self.__ActuatorRow(actuatorType, actuatorId)
+        row = self.__rows.get((sensorType, sensorId, statistic))
+        if row is None:
+            row = len(self.__target)
+            self.__rows[(sensorType, sensorId, statistic)] = row
+            self.__sensorRows.setdefault((sensorType, sensorId), []).append(row)
+            self.__statistic.append(statistic)
+            self.__thresholds.extend(thresholds)
+            self.__hysteresis.append(hysteresis)
+            self.__target.append(target)
+            self.__level.append(0)
+            self.__counts[target * (self.Levels + 1)] += 1
+            return
+        self.__thresholds[row * self.Levels:(row + 1) * self.Levels] = array.array('d', thresholds)
+        self.__hysteresis[row] = hysteresis
+        if self.__target[row] != target:
+            level = self.__level[row]
+            self.__counts[self.__target[row] * (self.Levels + 1) + level] -= 1
+            self.__counts[target * (self.Levels + 1) + level] += 1
+            self.__target[row] = target
+
+    def Rules(self):
+        return len(self.__target)
+
+    def SetActuatorState(self, actuatorType, actuatorId, state):
+        row = self.__actuatorRows.get((actuatorType, actuatorId))
+        if row is not None:
+            self.__state[row] = state
+
+    def ActuatorState(self, actuatorType, actuatorId):
+        row = self.__actuatorRows.get((actuatorType, actuatorId))
+        return self.__state[row] if row is not None else None
+
+    def DesiredState(self, actuatorType, actuatorId):
+        row = self.__actuatorRows.get((actuatorType, actuatorId))
+        return self.__Desired(row) if row is not None else None
+
+    def __Desired(self, target):
+        base = target * (self.Levels + 1)
+        for level in range(self.Levels, 0, -1):
+            if self.__counts[base + level] > 0:
+                return level
+        return 0
+
+    def Evaluate(self, sensorType, sensorIds, values, windows=None):
+        # updates the levels of the rules with a batch of readings in one
+        # pass over the tables, windows are the stream windows of the
+        # readings for the rules on statistics. Returns (actuatorType,
+        # actuatorId, desired state) of the actuators of the batch whose
+        # desired state differs from their confirmed state, every actuator
+        # at most once
+        levels     = self.Levels
+        stride     = levels + 1
+        sensorRows = self.__sensorRows
+        statistics = self.__statistic
+        thresholds = self.__thresholds
+        hysteresis = self.__hysteresis
+        target     = self.__target
+        current    = self.__level
+        counts     = self.__counts
+        touched    = {}
+        for i, sensorId in enumerate(sensorIds):
+            for row in sensorRows.get((sensorType, sensorId), ()):
+                statistic = statistics[row]
+                if statistic == streamstats.STAT_VALUE:
+                    value = values[i]
+                elif windows is not None and windows[i] is not None:
+                    value = windows[i].Get(statistic)
+                else:
+                    continue
+                if value is None:
+                    continue
+                base  = row * levels
+                level = current[row]
+                up    = 0
+                while up < levels and value > thresholds[base + up]:
+                    up = up + 1
+                if up < level:
+                    # falling, stay at the level until below its hysteresis band
+                    down = 0
+                    while down < level and value > thresholds[base + down] - hysteresis[row]:
+                        down = down + 1
+                    up = max(up, down)
+                actuator = target[row]
+                if up != level:
+                    counts[actuator * stride + level] -= 1
+                    counts[actuator * stride + up] += 1
+                    current[row] = up
+                touched[actuator] = True
+
+        transitions = []
+        for actuator in touched:
+            desired = self.__Desired(actuator)
+            if desired != self.__state[actuator]:
+                actuatorType, actuatorId = self.__actuators[actuator]
+                transitions.append((actuatorType, actuatorId, desired))
+        return transitions
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+#   Simple IOT demo in Linux
+#   Copyright (C) 2019  Jeune Prime M. Origines <primeyo2004@yahoo.com>
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import collections
+
+
+STAT_VALUE = 'value'
+STAT_EWMA  = 'ewma'
+STAT_MEAN  = 'mean'
+STAT_MAX   = 'max'
+STAT_SLOPE = 'slope'
+
+# the running sums of the slope are rebased to the oldest sample of the
+# window after this many seconds to keep their precision
+SLOPE_REBASE_AGE = 3600
+
+
+class StreamWindow:
+    # aggregates of the last max_samples samples of a stream, not older
+    # than max_age seconds from the newest one. Every aggregate is updated
+    # in O(1) (amortized for the max) per sample: the mean and the least
+    # squares slope from running sums, the max from a monotonic queue.
+    # The slope is in value units per minute. A sample older than the newest
+    # one, e.g. sent again after a reconnection, is only counted in Late.
+    def __init__(self, max_samples=32, max_age=None, alpha=0.2):
+        self.MaxSamples = max_samples
+        self.MaxAge     = max_age
+        self.Alpha      = alpha
+        self.Last       = None
+        self.Ewma       = None
+        self.Late       = 0
+        self.__samples  = collections.deque()
+        self.__maxQueue = collections.deque()
+        self.__sequence = 0
+        self.__base     = None
+        self.__sumV     = 0.0
+        self.__sumT     = 0.0
+        self.__sumTT    = 0.0
+        self.__sumTV    = 0.0
+
+    def __len__(self):
+        return len(self.__samples)
+
+    def Add(self, value, timestamp):
+        if len(self.__samples) > 0 and timestamp < self.__samples[-1][1]:
+            self.Late = self.Late + 1
+            return
+        if self.__base is None:
+            self.__base = timestamp
+        elif timestamp - self.__base > SLOPE_REBASE_AGE:
+            self.__Rebase(self.__samples[0][1] if len(self.__samples) > 0 else timestamp)
+
+        self.Last = value
+        self.Ewma = value if self.Ewma is None else self.Ewma + self.Alpha * (value - self.Ewma)
+        self.__sequence = self.__sequence + 1
+        self.__samples.append((self.__sequence, timestamp, value))
+        self.__AddSums(timestamp, value, 1)
+        while len(self.__maxQueue) > 0 and self.__maxQueue[-1][1] <= value:
+            self.__maxQueue.pop()
+        self.__maxQueue.append((self.__sequence, value))
+
+        while len(self.__samples) > self.MaxSamples or \
+                (self.MaxAge is not None and timestamp - self.__samples[0][1] > self.MaxAge):
+            sequence, oldTimestamp, oldValue = self.__samples.popleft()
+            self.__AddSums(oldTimestamp, oldValue, -1)
+            if self.__maxQueue[0][0] == sequence:
+                self.__maxQueue.popleft()
+
+    def __AddSums(self, timestamp, value, sign):
+        t = timestamp - self.__base
+        self.__sumV  = self.__sumV  + sign * value
+        self.__sumT  = self.__sumT  + sign * t
+        self.__sumTT = self.__sumTT + sign * t * t
+        self.__sumTV = self.__sumTV + sign * t * value
+
+    def __Rebase(self, base):
+        self.__base  = base
+        self.__sumV  = self.__sumT = self.__sumTT = self.__sumTV = 0.0
+        for sequence, timestamp, value in self.__samples:
+            self.__AddSums(timestamp, value, 1)
+
+    def Mean(self):
+        if len(self.__samples) == 0:
+            return None
+        return self.__sumV / len(self.__samples)
+
+    def Max(self):
+        if len(self.__maxQueue) == 0:
+            return None
+        return self.__maxQueue[0][1]
+
+    def Slope(self):
+        n = len(self.__samples)
+        if n < 2:
+            return None
+        denominator = n * self.__sumTT - self.__sumT * self.__sumT
+        if denominator <= 1e-9:
+            return None
+        return (n * self.__sumTV - self.__sumT * self.__sumV) / denominator * 60
+
+    def Get(self, statistic):
+        if statistic == STAT_VALUE:
+            return self.Last
+        if statistic == STAT_EWMA:
+            return self.Ewma
+        if statistic == STAT_MEAN:
+            return self.Mean()
+        if statistic == STAT_MAX:
+            return self.Max()
+        if statistic == STAT_SLOPE:
+            return self.Slope()
+        raise ValueError('Unknown statistic %s' % statistic)
+
+
+class StreamStats:
+    # windows of the streams by (deviceType, deviceId), all with the same limits
+    def __init__(self, max_samples=32, max_age=None, alpha=0.2):
+        self.MaxSamples = max_samples
+        self.MaxAge     = max_age
+        self.Alpha      = alpha
+        self.__windows  = {}
+
+    def __len__(self):
+        return len(self.__windows)
+
+    def Get(self, deviceType, deviceId):
+        return self.__windows.get((deviceType, deviceId))
+
+    def Add(self, deviceType, deviceId, value, timestamp):
+        window = self.__windows.get((deviceType, deviceId))
+        if window is None:
+            window = StreamWindow(self.MaxSamples, self.MaxAge, self.Alpha)
+            self.__windows[(deviceType, deviceId)] = window
+        window.Add(value, timestamp)
+        return window
+
+    def Remove(self, deviceType, deviceId):
+        self.__windows.pop((deviceType, deviceId), None)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+#   Simple IOT demo in Linux
+#   Copyright (C) 2019  Jeune Prime M. Origines <primeyo2004@yahoo.com>
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+try:
+  from gi.repository import GObject
+except ImportError:
+  import gobject as GObject
+
+
+class ActuatorWriter:
+    # desired state of one actuator characteristic (or write channel), only
+    # the latest desired value is kept and at most one write is in flight.
+    # A value equal to the last confirmed one isn't written again, failed
+    # writes are retried with exponential backoff. Writers of different
+    # actuators are independent, so their writes run concurrently.
+    # state_callback(value) is called with the confirmed value once no newer
+    # value is pending, or with the last confirmed one when the writes fail.
+    # Must be used from the GObject main loop thread.
+    def __init__(self, characteristic, state_callback, max_retries=5, backoff=0.5, max_backoff=10.0):
+        self.Characteristic = characteristic
+        self.MaxRetries = max_retries
+        self.Backoff    = backoff
+        self.MaxBackoff = max_backoff
+        self.Desired    = None
+        self.Confirmed  = None
+        self.Writes     = 0
+        self.Coalesced  = 0
+        self.Skipped    = 0
+        self.Retries    = 0
+        self.Failures   = 0
+        self.__stateCallback = state_callback
+        self.__inflight = None
+        self.__retry    = 0
+        self.__timerId  = None
+        self.__closed   = False
+
+    def Set(self, value):
+        # returns False so that it can be scheduled with GObject.idle_add
+        if value != self.Desired:
+            # a new desired value gets its own retries, without the backoff
+            # of the previous one
+            self.__retry = 0
+            if self.__timerId is not None:
+                GObject.source_remove(self.__timerId)
+                self.__timerId = None
+        if self.__inflight is not None:
+            if self.Desired != value:
+                self.Coalesced = self.Coalesced + 1
+            self.Desired = value
+            return False
+        if self.__timerId is not None:
+            # the same value is waiting for its retry
+            return False
+        self.Desired = value
+        if value == self.Confirmed:
+            self.Skipped = self.Skipped + 1
+            self.__stateCallback(self.Confirmed)
+            return False
+        self.__retry = 0
+        self.__Write()
+        return False
+
+    def Pending(self):
+        return self.__inflight is not None or self.__timerId is not None
+
+    def __Write(self):
+        value = self.Desired
+        self.__inflight = value
+        self.Writes = self.Writes + 1
+        self.Characteristic.WriteValue([value],
+                reply_handler=lambda: self.__WriteDone(value),
+                error_handler=self.__WriteError)
+
+    def __WriteDone(self, value):
+        if self.__closed:
+            return
+        self.__inflight = None
+        self.__retry = 0
+        self.Confirmed = value
+        if self.Desired != value:
+            self.__Write()
+            return
+        self.__stateCallback(value)
+
+    def __WriteError(self, error):
+        if self.__closed:
+            return
+        self.__inflight = None
+        self.Failures = self.Failures + 1
+        print('D-Bus call failed: ' + str(error))
+        if self.__retry >= self.MaxRetries:
+            print('Giving up writing %s after %d retries' % (self.Desired, self.__retry))
+            self.__retry = 0
+            if self.Confirmed is not None:
+                self.__stateCallback(self.Confirmed)
+            return
+        delay = min(self.Backoff * (2 ** self.__retry), self.MaxBackoff)
+        self.__retry = self.__retry + 1
+        self.__timerId = GObject.timeout_add(int(delay * 1000), self.__RetryHandler)
+
+    def __RetryHandler(self):
+        self.__timerId = None
+        self.Retries = self.Retries + 1
+        if self.Desired == self.Confirmed:
+            self.__stateCallback(self.Confirmed)
+            return False
+        self.__Write()
+        return False
+
+    def Close(self):
+        # the reply of a write still in flight is ignored
+        self.__closed = True
+        if self.__timerId is not None:
+            GObject.source_remove(self.__timerId)
+            self.__timerId = None
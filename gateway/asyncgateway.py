@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+#   Simple IOT demo in Linux
+#   Copyright (C) 2019  Jeune Prime M. Origines <primeyo2004@yahoo.com>
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import asyncio
+import concurrent.futures
+import dbus
+import sys
+import threading
+
+try:
+  from gi.repository import GObject
+except ImportError:
+  import gobject as GObject
+
+
+class GLibLoopThread(threading.Thread):
+    # runs the GObject main loop which dispatches the D-Bus replies, signals
+    # and the fd watches of the BLE channels
+    def __init__(self):
+        threading.Thread.__init__(self, name='glib', daemon=True)
+        self.MainLoop = GObject.MainLoop()
+
+    def run(self):
+        self.MainLoop.run()
+
+    def Stop(self):
+        self.MainLoop.quit()
+        self.join()
+
+
+class AsyncGatewayRuntime:
+    # drives a SimpleGatewayImpl from asyncio tasks instead of GObject timers:
+    # sampling, reading, publishing and the actuator writes are separate tasks
+    # connected by bounded queues. The actuator writers issue their D-Bus
+    # calls asynchronously from the GLib thread, the discovery runs on an
+    # executor and the MQTT publishing (and the disk queue) goes through a
+    # single worker thread, which keeps the publishing order and the non
+    # thread safe state of the publishers on one thread.
+    def __init__(self, gateway_impl, sample_interval, read_interval, queue_size=100, rescan_interval=None):
+        self.Gateway        = gateway_impl
+        self.RescanInterval = rescan_interval
+        self.SampleInterval = sample_interval
+        self.ReadInterval   = read_interval
+        self.QueueSize      = queue_size
+        self.ReadingsStalled = 0
+        self.CommandsDropped = 0
+        self.Failed         = 0
+        self.__loop         = None
+        self.__readings     = None
+        self.__commands     = None
+        self.__tasks        = []
+        self.__publishExecutor = None
+
+    async def Run(self):
+        self.__loop     = asyncio.get_running_loop()
+        self.__readings = asyncio.Queue(self.QueueSize)
+        self.__commands = asyncio.Queue(self.QueueSize)
+        self.__publishExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='publish')
+        glibThread = GLibLoopThread()
+        glibThread.start()
+        try:
+            self.Gateway.actuatorStateCallback = self.__ActuatorStateCallback
+            await self.__Publish(self.Gateway.StartDevices, self.__CommandCallback)
+            self.__tasks = [asyncio.ensure_future(task) for task in
+                    [self.__SampleTask(), self.__ReadTask(), self.__PublishTask(), self.__ActuatorTask()] +
+                    [self.__TimerTask(interval / 1000, callback) for interval, callback in self.Gateway.Timers()]]
+            if self.Gateway.actuatorDiscovery is not None and self.RescanInterval is not None:
+                self.__tasks.append(asyncio.ensure_future(self.__RescanTask(self.RescanInterval)))
+            await asyncio.gather(*self.__tasks)
+        finally:
+            for task in self.__tasks:
+                task.cancel()
+            await asyncio.gather(*self.__tasks, return_exceptions=True)
+            glibThread.Stop()
+            self.__publishExecutor.shutdown()
+
+    def __Publish(self, callback, *args):
+        return self.__loop.run_in_executor(self.__publishExecutor, callback, *args)
+
+    def __Failed(self, what, ex):
+        # a failure ends the iteration of a task, not the task
+        self.Failed = self.Failed + 1
+        print('Failed to %s: %s' % (what, ex))
+
+    def __CommandCallback(self, command):
+        # called by the MQTT client thread
+        self.__loop.call_soon_threadsafe(self.__QueueCommand, command)
+
+    def __QueueCommand(self, command):
+        if self.__commands.full():
+            self.__commands.get_nowait()
+            self.CommandsDropped = self.CommandsDropped + 1
+            print('Actuator command queue is full, dropped the oldest command')
+        self.__commands.put_nowait(command)
+
+    async def __SampleTask(self):
+        while True:
+            try:
+                self.Gateway.CollectSamples()
+            except Exception as ex:
+                self.__Failed('collect the samples', ex)
+            await asyncio.sleep(self.SampleInterval)
+
+    async def __ReadTask(self):
+        # while the publisher is behind, the readings wait here and the
+        # samples keep accumulating in the sampler buffers
+        while True:
+            await asyncio.sleep(self.ReadInterval)
+            try:
+                readings = self.Gateway.Readings()
+            except Exception as ex:
+                self.__Failed('read the sensors', ex)
+                continue
+            for reading in readings:
+                if self.__readings.full():
+                    self.ReadingsStalled = self.ReadingsStalled + 1
+                await self.__readings.put(reading)
+
+    async def __PublishTask(self):
+        while True:
+            reading = await self.__readings.get()
+            try:
+                await self.__Publish(self.Gateway.PublishReading, *reading)
+            except Exception as ex:
+                self.__Failed('publish the reading of %s' % reading[0], ex)
+
+    async def __ActuatorTask(self):
+        while True:
+            command = await self.__commands.get()
+            # the writers of the actuators run on the GLib thread, each one
+            # coalesces its commands so the tags are written concurrently
+            try:
+                accepted = self.Gateway.AcceptCommand(command)
+                if accepted is not None:
+                    self.Gateway.SubmitCommand(*accepted)
+            except Exception as ex:
+                self.__Failed('process command %s' % command.command, ex)
+
+    def __ActuatorStateCallback(self, device):
+        # called by the GLib thread when a new actuator state is confirmed
+        self.__loop.call_soon_threadsafe(self.__PublishActuatorState, device)
+
+    def __PublishActuatorState(self, device):
+        # nothing awaits the publishing, its failure is reported here
+        future = self.__Publish(self.Gateway.PublishActuatorState, device)
+        future.add_done_callback(lambda future: self.__PublishDone(future, device))
+
+    def __PublishDone(self, future, device):
+        if not future.cancelled() and future.exception() is not None:
+            print('Publishing the state of %s failed: %s' % (device.DeviceId, future.exception()))
+
+    async def __RescanTask(self, interval):
+        # the scan does blocking D-Bus calls, it runs on the default executor,
+        # the writers of the tags are then updated in the GLib thread
+        discovery = self.Gateway.actuatorDiscovery
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                found, gone = await self.__loop.run_in_executor(None, discovery.Discover)
+            except dbus.exceptions.DBusException as ex:
+                # e.g. a tag which went away during the scan, retried next time
+                print('ITAG rescan failed: ' + str(ex), file=sys.stderr)
+                continue
+            GObject.idle_add(self.Gateway.UpdateActuators, found, gone)
+
+    async def __TimerTask(self, interval, callback):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await self.__Publish(callback):
+                    return
+            except Exception as ex:
+                self.__Failed('run %s' % callback.__name__, ex)
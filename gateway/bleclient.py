@@ -17,11 +17,23 @@
 #   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
 
+import concurrent.futures
 import dbus
-from xml.dom import minidom
+import dbus.mainloop.glib
+import json
+import os
+import threading
+import weakref
+import xml.parsers.expat
 
+try:
+  from gi.repository import GObject
+except ImportError:
+  import gobject as GObject
 
 
+
+BLUEZ_ROOT_PATH            = '/'
 BLUEZ_OBJECT_PATH          = '/org/bluez'
 BLUEZ_SERVICE_NAME         = 'org.bluez'
 BLUEZ_DEVICE_IFACE         = 'org.bluez.Device1'
@@ -30,32 +42,184 @@ GATT_CHRC_IFACE            = 'org.bluez.GattCharacteristic1'
 
 DBUS_INTROSPECTABLE_IFACE  = 'org.freedesktop.DBus.Introspectable'
 DBUS_PROP_IFACE            = 'org.freedesktop.DBus.Properties'
+DBUS_OM_IFACE              = 'org.freedesktop.DBus.ObjectManager'
+
+LOADER_INTROSPECT          = 'introspect'
+LOADER_OBJECT_MANAGER      = 'objectmanager'
+
+class ProxyCache:
+    # proxy objects of a bus by object path, an entry lives as long as a
+    # client holds the proxy and is evicted when bluez removes the object.
+    # Proxies are not introspected, the method calls carry their signature.
+    def __init__(self, bus):
+        # the bus is only weakly referenced, it keys the cache of caches
+        self.__bus = weakref.ref(bus)
+        self.Hits = 0
+        self.Misses = 0
+        self.__lock = threading.Lock()
+        self.__proxies = weakref.WeakValueDictionary()
+        # the match is held by the bus, holding it here would keep the bus alive
+        bus.add_signal_receiver(self.__InterfacesRemovedHandler,
+                signal_name='InterfacesRemoved',
+                dbus_interface=DBUS_OM_IFACE,
+                bus_name=BLUEZ_SERVICE_NAME)
+
+    @property
+    def Bus(self):
+        return self.__bus()
+
+    def GetObject(self, path):
+        with self.__lock:
+            proxy_object = self.__proxies.get(path)
+            if proxy_object is not None:
+                self.Hits = self.Hits + 1
+                return proxy_object
+            self.Misses = self.Misses + 1
+            proxy_object = self.Bus.get_object(BLUEZ_SERVICE_NAME, path, introspect=False)
+            self.__proxies[path] = proxy_object
+            return proxy_object
+
+    def Evict(self, path):
+        # the children are gone along with the object
+        with self.__lock:
+            for cached_path in list(self.__proxies.keys()):
+                if cached_path == path or cached_path.startswith(path + '/'):
+                    self.__proxies.pop(cached_path, None)
+
+    def __InterfacesRemovedHandler(self, path, interfaces):
+        self.Evict(path)
+
+    def __len__(self):
+        return len(self.__proxies)
+
+
+proxy_caches = weakref.WeakKeyDictionary()
+proxy_caches_lock = threading.Lock()
+
+def get_proxy_cache(bus):
+    # one cache per bus, also called from the FetchDevicesConcurrent workers
+    with proxy_caches_lock:
+        proxy_cache = proxy_caches.get(bus)
+        if proxy_cache is None:
+            proxy_cache = ProxyCache(bus)
+            proxy_caches[bus] = proxy_cache
+        return proxy_cache
+
+def get_proxy_object(bus, path):
+    return get_proxy_cache(bus).GetObject(path)
+
+
+def parse_introspect_childnodes(intro_xml):
+    # stream the document through expat and only keep the names of the
+    # <node> elements below the root, no DOM is built for the reply
+    childnode_names = []
+    root_seen = False
+
+    def start_element(name, attrs):
+        nonlocal root_seen
+        if name == 'node':
+            if root_seen:
+                childnode_names.append(attrs.get('name', ''))
+            root_seen = True
+
+    parser = xml.parsers.expat.ParserCreate()
+    parser.StartElementHandler = start_element
+    parser.Parse(intro_xml, True)
+    return childnode_names
 
 def get_bluez_childnodes(bus, path):
     # use dbus introspect approach which is more efficient
     # compare with org.freedesktop.DBus.ObjectManager.GetManagedObjects()
     # should the system has too many d-bus objects
-    bluez_childnode_names = []
-    intro = dbus.Interface(bus.get_object(BLUEZ_SERVICE_NAME, path), DBUS_INTROSPECTABLE_IFACE)
-    intro_doc  = minidom.parseString(intro.Introspect())
-    intro_node = intro_doc.documentElement
-    intro_childnodes = intro_node.getElementsByTagName("node")
-    for cn in intro_childnodes:
-        bluez_childnode_names.append(cn.getAttribute('name'))
-    return bluez_childnode_names 
+    intro = dbus.Interface(get_proxy_object(bus, path), DBUS_INTROSPECTABLE_IFACE)
+    return parse_introspect_childnodes(intro.Introspect())
 
 
 class DBusClient:
-    def __init__(self, bus, path, iface_name, proxyObject):
+    def __init__(self, bus, path, iface_name, proxyObject, snapshot=False):
         self.Bus = bus
         self.Path = path
         self.IfaceName = iface_name
         self.ProxyObject = proxyObject
+        self.Snapshot = snapshot
+        self.CacheHits = 0
+        self.CacheMisses = 0
+        self.__properties = None
+        self.__invalidated = set()
+        self.__seeded = None
+        self.__signalMatch = None
+        self.__listeners = []
+        self.__interface = None
 
     def GetInterface(self):
-        return dbus.Interface(self.ProxyObject, self.IfaceName)
-
-    def GetProperty(self, propname):
+        if self.__interface is None:
+            self.__interface = dbus.Interface(self.ProxyObject, self.IfaceName)
+        return self.__interface
+
+    def RefreshProperties(self):
+        # fetch all the properties of the interface in a single round trip
+        dbus_iface = self.GetInterface()
+        self.__properties = dict(dbus_iface.GetAll(self.IfaceName, dbus_interface=DBUS_PROP_IFACE))
+        self.__invalidated.clear()
+        return self.__properties
+
+    def SetProperties(self, properties):
+        # use properties already fetched elsewhere e.g. from GetManagedObjects
+        self.Snapshot = True
+        self.__properties = dict(properties)
+        self.__invalidated.clear()
+
+    def SeedProperties(self, properties):
+        # values of properties which don't change e.g. from the GATT cache,
+        # served without a round trip, the others are read as usual
+        self.__seeded = dict(properties)
+
+    def GetAllProperties(self):
+        if self.__properties is None:
+            self.RefreshProperties()
+        return self.__properties
+
+    def WatchProperties(self):
+        # keep the property cache current using PropertiesChanged signals,
+        # subscribe first so that no change is lost before the snapshot
+        if self.__signalMatch is None:
+            self.__signalMatch = self.ProxyObject.connect_to_signal('PropertiesChanged',
+                    self.__PropertiesChangedHandler,
+                    dbus_interface=DBUS_PROP_IFACE)
+            self.RefreshProperties()
+
+    def UnwatchProperties(self):
+        if self.__signalMatch is not None:
+            self.__signalMatch.remove()
+            self.__signalMatch = None
+
+    @property
+    def Watching(self):
+        return self.__signalMatch is not None
+
+    def AddPropertiesListener(self, callback):
+        # callback(client, changed, invalidated) after the cache is updated
+        self.__listeners.append(callback)
+        self.WatchProperties()
+
+    def RemovePropertiesListener(self, callback):
+        if callback in self.__listeners:
+            self.__listeners.remove(callback)
+
+    def __PropertiesChangedHandler(self, iface_name, changed, invalidated):
+        if iface_name != self.IfaceName or self.__properties is None:
+            return
+        for propname, value in changed.items():
+            self.__properties[propname] = value
+            self.__invalidated.discard(propname)
+        for propname in invalidated:
+            # value is no longer sent along, re-read it on next access
+            self.__properties.pop(propname, None)
+            self.__invalidated.add(propname)
+        for listener in list(self.__listeners):
+            listener(self, changed, invalidated)
+
+    def __GetRemoteProperty(self, propname):
         dbus_iface = self.GetInterface() 
         try:
             return dbus_iface.Get(self.IfaceName , propname, dbus_interface=DBUS_PROP_IFACE)
@@ -65,26 +229,231 @@ class DBusClient:
                 raise ex
             return None
 
+    def GetProperty(self, propname):
+        if self.__seeded is not None and propname in self.__seeded:
+            self.CacheHits += 1
+            return self.__seeded[propname]
+
+        if not self.Snapshot and self.__signalMatch is None:
+            return self.__GetRemoteProperty(propname)
+
+        if self.__properties is None:
+            self.CacheMisses += 1
+            self.RefreshProperties()
+        elif propname in self.__invalidated:
+            self.CacheMisses += 1
+            value = self.__GetRemoteProperty(propname)
+            self.__invalidated.discard(propname)
+            if value is not None:
+                self.__properties[propname] = value
+            return value
+        else:
+            self.CacheHits += 1
+
+        # properties missing in the cache are not available on the object
+        return self.__properties.get(propname)
+
     def LoadGattChildren(self):
         pass
 
+class BluezNotifyChannel:
+    # notifications read straight from the AcquireNotify file descriptor,
+    # each read of the seqpacket socket returns one notification
+    def __init__(self, chrc, fd, mtu):
+        self.Characteristic = chrc
+        self.Fd = fd
+        self.MTU = mtu
+        self.__watchId = None
+        self.__callback = None
+
+    def fileno(self):
+        return self.Fd
+
+    def Read(self):
+        if self.Fd is None:
+            return None
+        value = os.read(self.Fd, self.MTU)
+        if len(value) == 0:
+            self.Close()
+            return None
+        return value
+
+    def __iter__(self):
+        while True:
+            value = self.Read()
+            if value is None:
+                return
+            yield value
+
+    def Watch(self, callback):
+        # deliver the notifications to callback(value) from the main loop
+        self.__callback = callback
+        if self.__watchId is None:
+            self.__watchId = GObject.io_add_watch(self.Fd,
+                    GObject.IO_IN | GObject.IO_HUP | GObject.IO_ERR,
+                    self.__IOHandler)
+
+    def __IOHandler(self, fd, condition):
+        # the watch ends by returning False, Close() must not remove it as well
+        watchId = self.__watchId
+        self.__watchId = None
+        if condition & GObject.IO_IN:
+            value = self.Read()
+            if value is not None:
+                self.__watchId = watchId
+                self.__callback(value)
+                return True
+        self.Close()
+        return False
+
+    def Close(self):
+        if self.__watchId is not None:
+            GObject.source_remove(self.__watchId)
+            self.__watchId = None
+        if self.Fd is not None:
+            os.close(self.Fd)
+            self.Fd = None
+
+
+class BluezWriteChannel:
+    # writes to the characteristic through the AcquireWrite file descriptor
+    # and falls back to WriteValue when it can't be used, only the latest
+    # pending value is kept while a write is still in progress
+    def __init__(self, chrc):
+        self.Characteristic = chrc
+        self.Fd = None
+        self.MTU = 0
+        self.Coalesced = 0
+        self.__pending = None
+        self.__writing = False
+        self.__watchId = None
+
+    def Acquire(self):
+        flags = self.Characteristic.Flags or []
+        if 'write-without-response' not in flags or self.Characteristic.WriteAcquired is None:
+            return False
+        iface = self.Characteristic.GetInterface()
+        try:
+            fd, mtu = iface.AcquireWrite(dbus.Dictionary({}, signature='sv'), dbus_interface=GATT_CHRC_IFACE)
+        except dbus.exceptions.DBusException as ex:
+            print('AcquireWrite failed, using WriteValue: ' + str(ex))
+            return False
+        self.Fd = fd.take()
+        self.MTU = int(mtu)
+        os.set_blocking(self.Fd, False)
+        return True
+
+    def WriteValue(self, value, reply_handler=None, error_handler=None):
+        # handlers of a coalesced value are dropped along with it
+        if self.__pending is not None:
+            self.Coalesced = self.Coalesced + 1
+        self.__pending = (value, reply_handler, error_handler)
+        self.__Flush()
+
+    def __Flush(self):
+        if self.__pending is None or self.__writing or self.__watchId is not None:
+            return
+        value, reply_handler, error_handler = self.__pending
+
+        if self.Fd is not None and len(value) <= self.MTU:
+            try:
+                os.write(self.Fd, bytes(value))
+            except BlockingIOError:
+                self.__watchId = GObject.io_add_watch(self.Fd,
+                        GObject.IO_OUT | GObject.IO_HUP | GObject.IO_ERR,
+                        self.__IOHandler)
+                return
+            except OSError as ex:
+                # the socket is closed by bluez e.g. on reconnection
+                print('AcquireWrite channel closed, using WriteValue: ' + str(ex))
+                self.__CloseFd()
+            else:
+                self.__pending = None
+                if reply_handler is not None:
+                    reply_handler()
+                return
+
+        self.__pending = None
+        self.__writing = True
+        self.Characteristic.WriteValue(value,
+                reply_handler=lambda: self.__WriteValueDone(reply_handler),
+                error_handler=lambda error: self.__WriteValueDone(error_handler, error))
+
+    def __WriteValueDone(self, handler, *args):
+        self.__writing = False
+        if handler is not None:
+            handler(*args)
+        self.__Flush()
+
+    def __IOHandler(self, fd, condition):
+        self.__watchId = None
+        if not condition & GObject.IO_OUT:
+            self.__CloseFd()
+        self.__Flush()
+        return False
+
+    def __CloseFd(self):
+        if self.Fd is not None:
+            os.close(self.Fd)
+            self.Fd = None
+
+    def Close(self):
+        if self.__watchId is not None:
+            GObject.source_remove(self.__watchId)
+            self.__watchId = None
+        self.__CloseFd()
+
+
 class BluezClientCharacteristic(DBusClient):
-    def __init__(self, bus, path, iface_name, proxyObject):
-        DBusClient.__init__(self, bus, path, iface_name, proxyObject)
+    def __init__(self, bus, path, iface_name, proxyObject, snapshot=False):
+        DBusClient.__init__(self, bus, path, iface_name, proxyObject, snapshot)
+        self.__notifyCallback = None
 
     def ReadValue(self, reply_handler=None, error_handler=None):
         iface = self.GetInterface()
-        return iface.ReadValue({},
+        return iface.ReadValue(dbus.Dictionary({}, signature='sv'),
                 reply_handler=reply_handler,
                 error_handler=error_handler,
                 dbus_interface=GATT_CHRC_IFACE)
 
     def WriteValue(self, value, reply_handler=None, error_handler=None):
         iface = self.GetInterface()
-        return iface.WriteValue(value, {},
+        return iface.WriteValue(dbus.Array(value, signature='y'), dbus.Dictionary({}, signature='sv'),
                  reply_handler=reply_handler,
                 error_handler=error_handler,
                 dbus_interface=GATT_CHRC_IFACE)
+
+    def StartNotify(self, callback, reply_handler=None, error_handler=None):
+        # Value changes are delivered to callback(value) through PropertiesChanged
+        self.__notifyCallback = callback
+        self.AddPropertiesListener(self.__ValueChangedHandler)
+        iface = self.GetInterface()
+        return iface.StartNotify(reply_handler=reply_handler,
+                error_handler=error_handler,
+                dbus_interface=GATT_CHRC_IFACE)
+
+    def StopNotify(self, reply_handler=None, error_handler=None):
+        self.RemovePropertiesListener(self.__ValueChangedHandler)
+        self.__notifyCallback = None
+        iface = self.GetInterface()
+        return iface.StopNotify(reply_handler=reply_handler,
+                error_handler=error_handler,
+                dbus_interface=GATT_CHRC_IFACE)
+
+    def __ValueChangedHandler(self, client, changed, invalidated):
+        if 'Value' in changed and self.__notifyCallback is not None:
+            self.__notifyCallback(bytes(changed['Value']))
+
+    def AcquireNotify(self):
+        # notifications bypass D-Bus entirely, closing the channel stops them
+        iface = self.GetInterface()
+        fd, mtu = iface.AcquireNotify(dbus.Dictionary({}, signature='sv'), dbus_interface=GATT_CHRC_IFACE)
+        return BluezNotifyChannel(self, fd.take(), int(mtu))
+
+    def CreateWriteChannel(self):
+        channel = BluezWriteChannel(self)
+        channel.Acquire()
+        return channel
  
     @property
     def UUID(self):
@@ -116,8 +485,8 @@ class BluezClientCharacteristic(DBusClient):
 
 
 class BluezClientService(DBusClient):
-    def __init__(self, bus, path, iface_name, proxyObject):
-        DBusClient.__init__(self, bus, path, iface_name, proxyObject)
+    def __init__(self, bus, path, iface_name, proxyObject, snapshot=False):
+        DBusClient.__init__(self, bus, path, iface_name, proxyObject, snapshot)
         self.__characteristics = None
 
     def LoadGattChildren(self):
@@ -127,10 +496,13 @@ class BluezClientService(DBusClient):
             characteristics = get_bluez_childnodes(self.Bus, self.Path)
             for chrc in characteristics:
                 chrc_path = self.Path + '/' + chrc
-                chrc_proxy_object = self.Bus.get_object(BLUEZ_SERVICE_NAME, chrc_path)
-                chrc_client = BluezClientCharacteristic(self.Bus, chrc_path, GATT_CHRC_IFACE, chrc_proxy_object)
+                chrc_proxy_object = get_proxy_object(self.Bus, chrc_path)
+                chrc_client = BluezClientCharacteristic(self.Bus, chrc_path, GATT_CHRC_IFACE, chrc_proxy_object, self.Snapshot)
                 self.__characteristics[chrc_client.UUID] = chrc_client
 
+    def SetGattChildren(self, characteristics):
+        self.__characteristics = characteristics
+
     def GetCharactristic(self, uuid):
         self.LoadGattChildren()
         if uuid in self.__characteristics.keys():
@@ -160,21 +532,31 @@ class BluezClientService(DBusClient):
 
 
 class BluezClientDevice(DBusClient):
-    def __init__(self, bus, path, iface_name, proxyObject):
-        DBusClient.__init__(self, bus, path, iface_name, proxyObject)
+    def __init__(self, bus, path, iface_name, proxyObject, snapshot=False):
+        DBusClient.__init__(self, bus, path, iface_name, proxyObject, snapshot)
+        self.GattCache = None
         self.__services = None
 
     def LoadGattChildren(self):
+        if self.__services is None and self.GattCache is not None:
+            self.__services = self.GattCache.Restore(self)
+
         if self.__services is None:
             self.__services = {}
             global get_bluez_childnodes
             services = get_bluez_childnodes(self.Bus, self.Path)
             for serv in services:
                 serv_path = self.Path + '/' + serv
-                serv_proxy_object = self.Bus.get_object(BLUEZ_SERVICE_NAME, serv_path)
-                serv_client = BluezClientService(self.Bus, serv_path, GATT_SERVICE_IFACE, serv_proxy_object)
+                serv_proxy_object = get_proxy_object(self.Bus, serv_path)
+                serv_client = BluezClientService(self.Bus, serv_path, GATT_SERVICE_IFACE, serv_proxy_object, self.Snapshot)
                 self.__services[serv_client.UUID] = serv_client 
 
+            if self.GattCache is not None:
+                self.GattCache.Store(self, self.__services)
+
+    def SetGattChildren(self, services):
+        self.__services = services
+
     def GetService(self, uuid):
         self.LoadGattChildren()
         if uuid in self.__services.keys():
@@ -283,18 +665,270 @@ class BluezClientDevice(DBusClient):
         return self.GetProperty('AdvertisingData')
 
 
-def FetchDevices(bus, device_filter_callback, adapter='hci0'):
+class GattCache:
+    # persistent map of device address to the object paths of its services
+    # and characteristics and the flags of the characteristics, an entry is only used as long as the device has
+    # its services resolved with the same UUIDs as when it was stored and
+    # the stored service paths still exist
+    def __init__(self, filename):
+        self.FileName = filename
+        self.__lock = threading.Lock()
+        self.__entries = {}
+        self.Load()
+
+    def Load(self):
+        try:
+            with open(self.FileName) as f:
+                self.__entries = json.load(f)
+        except (OSError, ValueError):
+            self.__entries = {}
+
+    def Save(self):
+        tmp_filename = self.FileName + '.tmp'
+        with open(tmp_filename, 'w') as f:
+            json.dump(self.__entries, f, indent=1, sort_keys=True)
+        os.replace(tmp_filename, self.FileName)
+
+    def Invalidate(self, address):
+        with self.__lock:
+            if self.__entries.pop(address, None) is not None:
+                self.Save()
+
+    def Restore(self, dev_client):
+        props   = dev_client.GetAllProperties()
+        address = props.get('Address')
+        with self.__lock:
+            entry = self.__entries.get(address)
+        if entry is None:
+            return None
+
+        if not props.get('ServicesResolved') or sorted(props.get('UUIDs') or []) != entry['uuids']:
+            self.Invalidate(address)
+            return None
+
+        bus = dev_client.Bus
+        services = {}
+        for serv_uuid, serv_entry in entry['services'].items():
+            serv_proxy_object = get_proxy_object(bus, serv_entry['path'])
+            serv_client = BluezClientService(bus, serv_entry['path'], GATT_SERVICE_IFACE, serv_proxy_object, dev_client.Snapshot)
+            characteristics = {}
+            for chrc_uuid, chrc_entry in serv_entry['characteristics'].items():
+                chrc_proxy_object = get_proxy_object(bus, chrc_entry['path'])
+                chrc_client = BluezClientCharacteristic(bus, chrc_entry['path'], GATT_CHRC_IFACE,
+                        chrc_proxy_object, dev_client.Snapshot)
+                seeded = {'UUID': chrc_uuid, 'Service': serv_entry['path']}
+                if 'flags' in chrc_entry:
+                    seeded['Flags'] = chrc_entry['flags']
+                chrc_client.SeedProperties(seeded)
+                characteristics[chrc_uuid] = chrc_client
+            serv_client.SetGattChildren(characteristics)
+            services[serv_uuid] = serv_client
+
+        if not self.__Verify(services):
+            print('GATT cache entry of %s is stale, resolving its services again' % address)
+            self.Invalidate(address)
+            return None
+        return services
+
+    def __Verify(self, services):
+        # one UUID read per service catches the paths gone stale e.g. after
+        # the device re-paired, the characteristics live below their service
+        for serv_uuid, serv_client in services.items():
+            try:
+                if serv_client.GetProperty('UUID') != serv_uuid:
+                    return False
+            except dbus.exceptions.DBusException as ex:
+                if ex.get_dbus_name() != 'org.freedesktop.DBus.Error.UnknownObject':
+                    raise ex
+                return False
+        return True
+
+    def Store(self, dev_client, services):
+        props = dev_client.GetAllProperties()
+        if not props.get('ServicesResolved'):
+            return
+
+        serv_entries = {}
+        for serv_uuid, serv_client in services.items():
+            chrc_entries = {}
+            for chrc_uuid, chrc_client in serv_client.GetAllCharacteristics().items():
+                chrc_entries[chrc_uuid] = {'path': chrc_client.Path,
+                        'flags': [str(flag) for flag in chrc_client.Flags or []]}
+            serv_entries[serv_uuid] = {'path': serv_client.Path, 'characteristics': chrc_entries}
+
+        with self.__lock:
+            self.__entries[props.get('Address')] = {'uuids': sorted(props.get('UUIDs') or []),
+                    'services': serv_entries}
+            self.Save()
+
+
+class DeviceFilter:
+    # declarative device filter usable as FetchDevices callback, the
+    # predicates are evaluated most selective first and stop at the first
+    # mismatch, callback is still called last for anything not covered
+    def __init__(self, name=None, alias=None, address_prefix=None, uuid=None,
+            connected=None, min_rssi=None, callback=None):
+        self.Callback = callback
+        self.__predicates = []
+        if connected is not None:
+            self.__predicates.append(('Connected', lambda value: bool(value) == connected))
+        if address_prefix is not None:
+            prefix = address_prefix.upper()
+            self.__predicates.append(('Address', lambda value: value is not None and value.upper().startswith(prefix)))
+        if name is not None:
+            self.__predicates.append(('Name', lambda value: value == name))
+        if alias is not None:
+            self.__predicates.append(('Alias', lambda value: value == alias))
+        if uuid is not None:
+            uuid = uuid.lower()
+            self.__predicates.append(('UUIDs', lambda value: value is not None and uuid in [u.lower() for u in value]))
+        if min_rssi is not None:
+            self.__predicates.append(('RSSI', lambda value: value is not None and value >= min_rssi))
+
+    def PropertyNames(self):
+        return [propname for propname, predicate in self.__predicates]
+
+    def Match(self, dev_client):
+        if len(self.__predicates) > 1 and not dev_client.Snapshot and not dev_client.Watching:
+            # a single fresh GetAll is cheaper than a Get per predicate
+            get_property = dev_client.RefreshProperties().get
+        else:
+            # the cached properties honour the PropertiesChanged invalidations
+            get_property = dev_client.GetProperty
+
+        for propname, predicate in self.__predicates:
+            if not predicate(get_property(propname)):
+                return False
+
+        if self.Callback is not None:
+            return self.Callback(dev_client)
+        return True
+
+    def __call__(self, dev_client):
+        return self.Match(dev_client)
+
+
+def get_bluez_managed_objects(bus):
+    om = dbus.Interface(get_proxy_object(bus, BLUEZ_ROOT_PATH), DBUS_OM_IFACE)
+    return om.GetManagedObjects()
+
+
+def LoadManagedDevices(bus, adapter='hci0'):
+    # build the whole device/service/characteristic hierarchy of the adapter
+    # out of a single GetManagedObjects reply, the clients get their property
+    # caches filled in so no further round trip is needed for the properties
+    adapter_path = BLUEZ_OBJECT_PATH + '/' + adapter
+    devices  = {}
+    services = {}
+    chrcs    = []
+
+    for path, ifaces in get_bluez_managed_objects(bus).items():
+        if BLUEZ_DEVICE_IFACE in ifaces:
+            props = ifaces[BLUEZ_DEVICE_IFACE]
+            if props.get('Adapter') != adapter_path:
+                continue
+            proxy_object = get_proxy_object(bus, path)
+            dev_client = BluezClientDevice(bus, path, BLUEZ_DEVICE_IFACE, proxy_object)
+            dev_client.SetProperties(props)
+            devices[path] = (dev_client, {})
+        elif GATT_SERVICE_IFACE in ifaces:
+            props = ifaces[GATT_SERVICE_IFACE]
+            proxy_object = get_proxy_object(bus, path)
+            serv_client = BluezClientService(bus, path, GATT_SERVICE_IFACE, proxy_object)
+            serv_client.SetProperties(props)
+            services[path] = (serv_client, {})
+        elif GATT_CHRC_IFACE in ifaces:
+            chrcs.append((path, ifaces[GATT_CHRC_IFACE]))
+
+    for path, props in chrcs:
+        serv = services.get(props.get('Service'))
+        if serv is None:
+            continue
+        proxy_object = get_proxy_object(bus, path)
+        chrc_client = BluezClientCharacteristic(bus, path, GATT_CHRC_IFACE, proxy_object)
+        chrc_client.SetProperties(props)
+        serv[1][chrc_client.UUID] = chrc_client
+
+    for serv_client, characteristics in services.values():
+        serv_client.SetGattChildren(characteristics)
+        dev = devices.get(serv_client.Device)
+        if dev is not None:
+            dev[1][serv_client.UUID] = serv_client
+
+    bluez_dev_clients = []
+    for dev_client, dev_services in devices.values():
+        dev_client.SetGattChildren(dev_services)
+        bluez_dev_clients.append(dev_client)
+
+    return bluez_dev_clients
+
+
+def FetchDevicesConcurrent(bus, device_filter_callback, adapter='hci0', snapshot=False,
+        max_workers=8, timeout=None, resolve_gatt=True, gatt_cache=None):
+    # filter the devices and resolve the GATT tree of the matching ones in a
+    # bounded pool of workers, matching devices are yielded as they complete
+    adapter_path = BLUEZ_OBJECT_PATH + '/' + adapter
+
+    def fetch_device(dev):
+        dev_path = adapter_path + '/' + dev
+        dev_proxy_object = get_proxy_object(bus, dev_path)
+        dev_client = BluezClientDevice(bus, dev_path, BLUEZ_DEVICE_IFACE, dev_proxy_object, snapshot)
+        dev_client.GattCache = gatt_cache
+        if not device_filter_callback(dev_client):
+            return None
+        if resolve_gatt:
+            for serv_client in dev_client.GetAllServices().values():
+                serv_client.LoadGattChildren()
+        return dev_client
+
+    # the proxies are used from the pool threads
+    dbus.mainloop.glib.threads_init()
+    devices = get_bluez_childnodes(bus, adapter_path)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers)
+    futures = []
+    try:
+        futures = [executor.submit(fetch_device, dev) for dev in devices]
+        for future in concurrent.futures.as_completed(futures, timeout):
+            try:
+                dev_client = future.result()
+            except dbus.exceptions.DBusException as ex:
+                # device removed or disconnected while resolving it
+                print('D-Bus call failed: ' + str(ex))
+                continue
+            if dev_client is not None:
+                yield dev_client
+    except concurrent.futures.TimeoutError:
+        print('Timeout while fetching devices, %d device(s) not resolved' %
+                len([future for future in futures if not future.done()]))
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def FetchDevices(bus, device_filter_callback, adapter='hci0', snapshot=False, loader=LOADER_INTROSPECT,
+        concurrency=None, timeout=None, gatt_cache=None):
+    if loader == LOADER_OBJECT_MANAGER:
+        # one GetManagedObjects reply, the clients are always snapshots
+        if concurrency is not None or gatt_cache is not None:
+            raise ValueError('concurrency and gatt_cache are not supported by the %s loader' % loader)
+        return [dev_client for dev_client in LoadManagedDevices(bus, adapter) 
+                if device_filter_callback(dev_client)]
+
+    if concurrency is not None:
+        return list(FetchDevicesConcurrent(bus, device_filter_callback, adapter, snapshot,
+                max_workers=concurrency, timeout=timeout, gatt_cache=gatt_cache))
+
     bluez_dev_clients = []
     adapter_path = BLUEZ_OBJECT_PATH + '/' + adapter
     devices = get_bluez_childnodes(bus, adapter_path)
     for dev in devices:
         dev_path = adapter_path + '/' + dev
-        dev_proxy_object = bus.get_object(BLUEZ_SERVICE_NAME, dev_path)
-        dev_client = BluezClientDevice(bus, dev_path, BLUEZ_DEVICE_IFACE, dev_proxy_object)
+        dev_proxy_object = get_proxy_object(bus, dev_path)
+        dev_client = BluezClientDevice(bus, dev_path, BLUEZ_DEVICE_IFACE, dev_proxy_object, snapshot)
+        dev_client.GattCache = gatt_cache
 
         if device_filter_callback(dev_client):
             bluez_dev_clients.append (dev_client)
 
     return bluez_dev_clients 
-
-
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+#   Simple IOT demo in Linux
+#   Copyright (C) 2019  Jeune Prime M. Origines <primeyo2004@yahoo.com>
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+# Benchmark of the bleclient GATT tree loaders against a fake BlueZ tree
+# and of the Introspect child node parser against minidom
+#   usage: bleclient_bench.py [devices] [services] [characteristics] [latency ms] [concurrency]
+
+import bleclient
+import fakebluez
+
+import sys
+import time
+import tracemalloc
+from xml.dom import minidom
+
+
+def filter_connected_itag (dev):
+    if dev.Name == 'ITAG':
+        if dev.Connected:
+            return True
+    return False
+
+def load_gatt_tree(bus, loader, concurrency):
+    bluezdevs = bleclient.FetchDevices(bus, filter_connected_itag, loader=loader, concurrency=concurrency)
+    nchrcs = 0
+    for dev in bluezdevs:
+        for serv in dev.GetAllServices().values():
+            nchrcs = nchrcs + len(serv.GetAllCharacteristics())
+    return bluezdevs, nchrcs
+
+def bench_loader(loader, ndevices, nservices, nchrcs, latency, concurrency=None):
+    bus = fakebluez.FakeBluezBus(latency)
+    bus.AddDevices(ndevices, nservices, nchrcs)
+
+    start = time.perf_counter()
+    bluezdevs, loaded = load_gatt_tree(bus, loader, concurrency)
+    elapsed = time.perf_counter() - start
+
+    if concurrency is not None:
+        loader = '%s x%d' % (loader, concurrency)
+    print('%-17s devices=%-5d characteristics=%-7d calls=%-7d time=%.3fs' %
+            (loader, len(bluezdevs), loaded, bus.Calls, elapsed))
+
+
+def minidom_childnodes(intro_xml):
+    # the former get_bluez_childnodes parser, kept as reference
+    intro_doc  = minidom.parseString(intro_xml)
+    intro_node = intro_doc.documentElement
+    return [cn.getAttribute('name') for cn in intro_node.getElementsByTagName("node")]
+
+def introspect_fixture(ndevices):
+    # Introspect reply of the adapter node with ndevices cached devices
+    bus = fakebluez.FakeBluezBus(0)
+    bus.AddDevices(ndevices, 0, 0)
+    return bus.Introspect(bleclient.BLUEZ_OBJECT_PATH + '/hci0')
+
+def bench_parser(name, parser, intro_xml, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        childnodes = parser(intro_xml)
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    parser(intro_xml)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    print('%-17s childnodes=%-6d time=%8.3fms peak memory=%8.1fkB' %
+            (name, len(childnodes), elapsed * 1000, peak / 1024))
+    return childnodes
+
+
+def main():
+    ndevices  = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    nservices = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    nchrcs    = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    latency   = float(sys.argv[4]) / 1000 if len(sys.argv) > 4 else 0.0002
+    concurrency = int(sys.argv[5]) if len(sys.argv) > 5 else 8
+
+    print('GATT tree load: %d devices x %d services x %d characteristics, %.2fms per call' %
+            (ndevices, nservices, nchrcs, latency * 1000))
+    for loader in [bleclient.LOADER_INTROSPECT, bleclient.LOADER_OBJECT_MANAGER]:
+        bench_loader(loader, ndevices, nservices, nchrcs, latency)
+    bench_loader(bleclient.LOADER_INTROSPECT, ndevices, nservices, nchrcs, latency, concurrency)
+
+    for size in [ndevices, ndevices * 10, ndevices * 100]:
+        intro_xml = introspect_fixture(size)
+        repeat = max(1, 20000 // size)
+        print('Introspect parse: %d cached devices, %d bytes' % (size, len(intro_xml)))
+        expected = bench_parser('minidom', minidom_childnodes, intro_xml, repeat)
+        childnodes = bench_parser('expat', bleclient.parse_introspect_childnodes, intro_xml, repeat)
+        if childnodes != expected:
+            print('Child nodes differ from minidom result', file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+#   Simple IOT demo in Linux
+#   Copyright (C) 2019  Jeune Prime M. Origines <primeyo2004@yahoo.com>
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import threading
+
+
+DEVICE_ANY = '+'
+
+
+class RegisteredDevice:
+    # an IoT device served by the gateway, Device is its driver (sensor
+    # sampler, BLE characteristic or write channel) and State its last state
+    def __init__(self, deviceType, deviceId, device):
+        self.DeviceType = deviceType
+        self.DeviceId   = deviceId
+        self.Device     = device
+        self.State      = {}
+
+
+class DeviceRegistry:
+    # maps the IoT deviceType/deviceId to the devices served by the gateway,
+    # and (deviceType, deviceId, command) to the command handlers, a handler
+    # registered with DEVICE_ANY as device id serves all the devices of a type.
+    # Devices may be added and removed while the gateway is running.
+    def __init__(self):
+        self.Unhandled  = 0
+        self.__lock     = threading.Lock()
+        self.__devices  = {}
+        self.__types    = {}
+        self.__handlers = {}
+
+    def Add(self, deviceType, deviceId, device):
+        registered = RegisteredDevice(deviceType, deviceId, device)
+        with self.__lock:
+            previous = self.__devices.get((deviceType, deviceId))
+            if previous is not None:
+                registered.State = previous.State
+            self.__devices[(deviceType, deviceId)] = registered
+            self.__types.setdefault(deviceType, {})[deviceId] = registered
+        return registered
+
+    def Remove(self, deviceType, deviceId):
+        with self.__lock:
+            self.__types.get(deviceType, {}).pop(deviceId, None)
+            return self.__devices.pop((deviceType, deviceId), None)
+
+    def Get(self, deviceType, deviceId):
+        return self.__devices.get((deviceType, deviceId))
+
+    def Devices(self, deviceType=None):
+        with self.__lock:
+            if deviceType is None:
+                return list(self.__devices.values())
+            return list(self.__types.get(deviceType, {}).values())
+
+    def DeviceTypes(self):
+        with self.__lock:
+            return list(self.__types.keys())
+
+    def __len__(self):
+        return len(self.__devices)
+
+    def AddCommandHandler(self, deviceType, command, handler, deviceId=DEVICE_ANY):
+        # handler(registered device, command)
+        self.__handlers[(deviceType, deviceId, command)] = handler
+
+    def Lookup(self, deviceType, deviceId, command):
+        # the device and the handler of the command, or None
+        device = self.__devices.get((deviceType, deviceId))
+        if device is None:
+            return None
+        handler = self.__handlers.get((deviceType, deviceId, command))
+        if handler is None:
+            handler = self.__handlers.get((deviceType, DEVICE_ANY, command))
+            if handler is None:
+                return None
+        return device, handler
+
+    def Dispatch(self, command):
+        # calls the handler of an ibmiotf device command, returns (device,
+        # result of the handler) or None when there is none for the command
+        found = self.Lookup(command.type, command.id, command.command)
+        if found is None:
+            self.Unhandled = self.Unhandled + 1
+            print('No handler for the command %s of %s (of type = %s)' % (command.command, command.id, command.type))
+            return None
+        device, handler = found
+        return device, handler(device, command)
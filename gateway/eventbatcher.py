@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+#   Simple IOT demo in Linux
+#   Copyright (C) 2019  Jeune Prime M. Origines <primeyo2004@yahoo.com>
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import time
+
+
+class EventBatch:
+    # readings of one device type in columns, one entry per reading
+    def __init__(self, deviceType):
+        self.DeviceType = deviceType
+        self.Created    = time.monotonic()
+        self.DeviceIds  = []
+        self.Timestamps = []
+        self.Columns    = {}
+
+    def __len__(self):
+        return len(self.DeviceIds)
+
+    def Add(self, deviceId, data, timestamp):
+        count = len(self.DeviceIds)
+        self.DeviceIds.append(deviceId)
+        self.Timestamps.append(round(timestamp, 3))
+        for name, value in data.items():
+            if name not in self.Columns:
+                self.Columns[name] = [None] * count
+            self.Columns[name].append(value)
+        for column in self.Columns.values():
+            if len(column) == count:
+                column.append(None)
+
+    def Payload(self):
+        payload = {'deviceType': self.DeviceType,
+                   'deviceId'  : self.DeviceIds,
+                   'timestamp' : self.Timestamps}
+        payload.update(self.Columns)
+        return payload
+
+
+class EventBatcher:
+    # accumulates the readings of many devices and publishes them as one
+    # gateway event per device type, once a batch reaches max_size readings
+    # or max_age seconds, Poll() is meant to be a main loop timeout callback
+    def __init__(self, iot_gateway, event, max_size=100, max_age=5.0, qos=1, msg_format='json'):
+        self.iotGateway = iot_gateway
+        self.Event      = event
+        self.MaxSize    = max_size
+        self.MaxAge     = max_age
+        self.QoS        = qos
+        self.MsgFormat  = msg_format
+        self.Published  = 0
+        self.Failed     = 0
+        self.__batches  = {}
+
+    def Add(self, deviceType, deviceId, data, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        batch = self.__batches.get(deviceType)
+        if batch is None:
+            batch = EventBatch(deviceType)
+            self.__batches[deviceType] = batch
+        batch.Add(deviceId, data, timestamp)
+        if len(batch) >= self.MaxSize:
+            self.Flush(deviceType)
+
+    def Poll(self):
+        now = time.monotonic()
+        for deviceType, batch in list(self.__batches.items()):
+            if now - batch.Created >= self.MaxAge:
+                self.Flush(deviceType)
+        return True
+
+    def Flush(self, deviceType=None):
+        deviceTypes = list(self.__batches.keys()) if deviceType is None else [deviceType]
+        for deviceType in deviceTypes:
+            batch = self.__batches.pop(deviceType, None)
+            if batch is not None and len(batch) > 0:
+                self.__Publish(batch)
+
+    def __Publish(self, batch):
+        success = self.iotGateway.publishGatewayEvent(self.Event, self.MsgFormat,
+                batch.Payload(), qos=self.QoS,
+                on_publish=self.__PublishCallback)
+        if success:
+            self.Published = self.Published + len(batch)
+        else:
+            self.Failed = self.Failed + len(batch)
+            print("Gateway not connected to IBM Watson IoT Platform while publishing %d %s readings" %
+                    (len(batch), batch.DeviceType))
+        return success
+
+    def __PublishCallback(self):
+        print('Publish batched readings successful!')
+
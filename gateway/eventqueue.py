@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+#   Simple IOT demo in Linux
+#   Copyright (C) 2019  Jeune Prime M. Origines <primeyo2004@yahoo.com>
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import collections
+import json
+import os
+import struct
+import threading
+import time
+
+
+SEGMENT_SUFFIX = '.seg'
+CURSOR_FILE    = 'cursor'
+RECORD_HEADER  = struct.Struct('<I')
+
+
+class DiskEventQueue:
+    # append-only queue of events in segment files, every record is a length
+    # prefixed JSON document. The read cursor only advances over records that
+    # were acknowledged, older segments are deleted once fully acknowledged and
+    # the oldest segments are evicted when the queue grows beyond max_bytes.
+    # Positions are (segment number, offset) tuples.
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024, segment_size=1024 * 1024, sync_every=100):
+        self.Directory   = directory
+        self.MaxBytes    = max_bytes
+        self.SegmentSize = segment_size
+        self.SyncEvery   = sync_every
+        self.Appended    = 0
+        self.Acked       = 0
+        self.EvictedSegments = 0
+        self.__lock      = threading.Lock()
+        self.__inflight  = collections.deque()
+        self.__unsynced  = 0
+        self.__reader    = None
+        self.__writer    = None
+
+        os.makedirs(directory, exist_ok=True)
+        self.__segments = sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(directory)
+                if name.endswith(SEGMENT_SUFFIX))
+        self.__commit = self.__LoadCursor()
+        self.__read   = self.__commit
+        if len(self.__segments) > 0:
+            self.__OpenWriter(self.__segments[-1])
+
+    def __SegmentPath(self, segment):
+        return os.path.join(self.Directory, '%08d%s' % (segment, SEGMENT_SUFFIX))
+
+    def __LoadCursor(self):
+        try:
+            with open(os.path.join(self.Directory, CURSOR_FILE)) as f:
+                segment, offset = [int(field) for field in f.read().split()]
+        except (OSError, ValueError):
+            segment, offset = 0, 0
+        if len(self.__segments) == 0:
+            return (0, 0)
+        if segment not in self.__segments:
+            return (self.__segments[0], 0)
+        return (segment, offset)
+
+    def __SaveCursor(self):
+        path = os.path.join(self.Directory, CURSOR_FILE)
+        with open(path + '.tmp', 'w') as f:
+            f.write('%d %d\n' % self.__commit)
+        os.replace(path + '.tmp', path)
+
+    def __OpenWriter(self, segment):
+        # drop a partially written record left behind by a crash
+        path = self.__SegmentPath(segment)
+        self.__writer = open(path, 'ab')
+        with open(path, 'rb') as f:
+            offset = 0
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                length = RECORD_HEADER.unpack(header)[0]
+                if len(f.read(length)) < length:
+                    break
+                offset = offset + RECORD_HEADER.size + length
+        if offset < self.__writer.tell():
+            self.__writer.truncate(offset)
+            self.__writer.seek(offset)
+
+    def __Rotate(self):
+        if self.__writer is not None:
+            self.__Sync()
+            self.__writer.close()
+        segment = self.__segments[-1] + 1 if len(self.__segments) > 0 else 0
+        self.__segments.append(segment)
+        if len(self.__segments) == 1:
+            self.__commit = self.__read = (segment, 0)
+        self.__writer = open(self.__SegmentPath(segment), 'ab')
+
+    def __Sync(self):
+        if self.__writer is not None:
+            self.__writer.flush()
+            os.fsync(self.__writer.fileno())
+        self.__SaveCursor()
+        self.__unsynced = 0
+
+    def __End(self):
+        if self.__writer is None:
+            return (0, 0)
+        return (self.__segments[-1], self.__writer.tell())
+
+    def __Evict(self):
+        sizes = [os.path.getsize(self.__SegmentPath(segment)) for segment in self.__segments[:-1]]
+        total = sum(sizes) + self.__writer.tell()
+        while total > self.MaxBytes and len(self.__segments) > 1:
+            segment = self.__segments.pop(0)
+            total = total - sizes.pop(0)
+            self.__RemoveSegment(segment)
+            self.EvictedSegments = self.EvictedSegments + 1
+            first = (self.__segments[0], 0)
+            self.__commit = max(self.__commit, first)
+            self.__read   = max(self.__read, first)
+            while len(self.__inflight) > 0 and self.__inflight[0][0] <= first:
+                self.__inflight.popleft()
+            print('Event queue is full, evicted segment %d' % segment)
+
+    def __RemoveSegment(self, segment):
+        if self.__reader is not None and self.__reader[0] == segment:
+            self.__reader[1].close()
+            self.__reader = None
+        os.remove(self.__SegmentPath(segment))
+
+    def Append(self, record):
+        payload = json.dumps(record, separators=(',', ':')).encode('utf-8')
+        with self.__lock:
+            if self.__writer is None or self.__writer.tell() >= self.SegmentSize:
+                self.__Rotate()
+            self.__writer.write(RECORD_HEADER.pack(len(payload)) + payload)
+            self.Appended = self.Appended + 1
+            self.__unsynced = self.__unsynced + 1
+            if self.__unsynced >= self.SyncEvery:
+                self.__Sync()
+            self.__Evict()
+
+    def Sync(self):
+        # fsync batched over appends, also meant as main loop timeout callback
+        with self.__lock:
+            self.__Sync()
+        return True
+
+    def Backlog(self):
+        # there are records which were not handed out by Next() yet
+        with self.__lock:
+            return self.__read < self.__End()
+
+    def Next(self):
+        # next record to send and its end position for Sent()/Ack(), or None
+        with self.__lock:
+            while self.__read < self.__End():
+                segment, offset = self.__read
+                if segment == self.__segments[-1]:
+                    self.__writer.flush()
+                if self.__reader is None or self.__reader[0] != segment:
+                    if self.__reader is not None:
+                        self.__reader[1].close()
+                    self.__reader = (segment, open(self.__SegmentPath(segment), 'rb'))
+                f = self.__reader[1]
+                f.seek(offset)
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    # end of a full segment, continue with the next one
+                    self.__read = (self.__segments[self.__segments.index(segment) + 1], 0)
+                    continue
+                length = RECORD_HEADER.unpack(header)[0]
+                record = json.loads(f.read(length).decode('utf-8'))
+                self.__read = (segment, offset + RECORD_HEADER.size + length)
+                return record, self.__read
+            return None
+
+    def Sent(self, position):
+        with self.__lock:
+            self.__inflight.append([position, False, time.monotonic()])
+
+    def InflightAge(self):
+        # seconds since the oldest unacknowledged record was sent, or None
+        with self.__lock:
+            for inflight in self.__inflight:
+                if not inflight[1]:
+                    return time.monotonic() - inflight[2]
+            return None
+
+    def Ack(self, position):
+        # may be called from the MQTT client thread and out of order
+        with self.__lock:
+            for inflight in self.__inflight:
+                if inflight[0] == position:
+                    inflight[1] = True
+                    break
+            while len(self.__inflight) > 0 and self.__inflight[0][1]:
+                self.__commit = self.__inflight.popleft()[0]
+                self.Acked = self.Acked + 1
+            while len(self.__segments) > 1 and self.__segments[0] < self.__commit[0]:
+                self.__RemoveSegment(self.__segments.pop(0))
+
+    def Rewind(self):
+        # resend everything that was not acknowledged yet
+        with self.__lock:
+            self.__read = self.__commit
+            self.__inflight.clear()
+
+    def Inflight(self):
+        with self.__lock:
+            return len(self.__inflight)
+
+    def Close(self):
+        with self.__lock:
+            self.__Sync()
+            if self.__reader is not None:
+                self.__reader[1].close()
+                self.__reader = None
+            if self.__writer is not None:
+                self.__writer.close()
+                self.__writer = None
+
+
+class StoreAndForwardPublisher:
+    # publishes through the gateway client while it is connected, events that
+    # fail to publish, or arrive while older ones are still queued, go to the
+    # disk queue and Replay() sends them in order at up to replay_rate per second.
+    # Records not acknowledged within ack_timeout seconds are sent again, as
+    # their on_publish callback may never come e.g. after a disconnection
+    def __init__(self, iot_gateway, event_queue, replay_rate=50, max_inflight=100, ack_timeout=30):
+        self.iotGateway  = iot_gateway
+        self.eventQueue  = event_queue
+        self.ReplayRate  = replay_rate
+        self.MaxInflight = max_inflight
+        self.AckTimeout  = ack_timeout
+        self.Queued      = 0
+        self.Replayed    = 0
+        self.Rewound     = 0
+        self.__offline   = False
+        self.__tokens    = 0.0
+        self.__lastReplay = time.monotonic()
+
+    def publishDeviceEvent(self, deviceType, deviceId, event, msgFormat, data, qos=0, on_publish=None):
+        return self.__Publish(['device', deviceType, deviceId, event, msgFormat, data, qos], on_publish)
+
+    def publishGatewayEvent(self, event, msgFormat, data, qos=0, on_publish=None):
+        return self.__Publish(['gateway', event, msgFormat, data, qos], on_publish)
+
+    def __Send(self, record, on_publish):
+        if record[0] == 'device':
+            return self.iotGateway.publishDeviceEvent(record[1], record[2], record[3], record[4], record[5],
+                    qos=record[6], on_publish=on_publish)
+        return self.iotGateway.publishGatewayEvent(record[1], record[2], record[3],
+                qos=record[4], on_publish=on_publish)
+
+    def __Publish(self, record, on_publish):
+        # False when the event was queued for replay instead of published
+        if not self.eventQueue.Backlog() and self.__Send(record, on_publish):
+            return True
+        if not self.__offline:
+            print("Gateway not connected to IBM Watson IoT Platform, queueing events for replay")
+            self.__offline = True
+        self.eventQueue.Append(record)
+        self.Queued = self.Queued + 1
+        return False
+
+    def Replay(self):
+        # main loop timeout callback, token bucket limits the replay rate
+        now = time.monotonic()
+        self.__tokens = min(self.__tokens + (now - self.__lastReplay) * self.ReplayRate, self.ReplayRate)
+        self.__lastReplay = now
+
+        age = self.eventQueue.InflightAge()
+        if age is not None and age > self.AckTimeout:
+            print("Queued events not acknowledged for %.0f seconds, sending them again" % age)
+            self.eventQueue.Rewind()
+            self.Rewound = self.Rewound + 1
+
+        while self.__tokens >= 1 and self.eventQueue.Inflight() < self.MaxInflight:
+            item = self.eventQueue.Next()
+            if item is None:
+                if self.__offline:
+                    print("Replay of the queued events completed")
+                    self.__offline = False
+                break
+            record, position = item
+            self.eventQueue.Sent(position)
+            if not self.__Send(record, lambda position=position: self.eventQueue.Ack(position)):
+                self.eventQueue.Rewind()
+                break
+            self.__tokens = self.__tokens - 1
+            self.Replayed = self.Replayed + 1
+        return True
+
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+#   Simple IOT demo in Linux
+#   Copyright (C) 2019  Jeune Prime M. Origines <primeyo2004@yahoo.com>
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+# Checks the crash recovery of the disk event queue: a partially written
+# record, acknowledgements out of order, a cursor into a deleted segment
+# and the eviction of segments with records still in flight.
+
+import eventqueue
+
+import os
+import sys
+import tempfile
+
+
+failures = 0
+
+
+def check(name, condition):
+    global failures
+    print('%-55s %s' % (name, 'ok' if condition else 'FAILED'))
+    if not condition:
+        failures = failures + 1
+
+
+def segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(eventqueue.SEGMENT_SUFFIX))
+
+
+def drain(queue):
+    # [(record, position)] of everything not handed out yet, marked as sent
+    items = []
+    while True:
+        item = queue.Next()
+        if item is None:
+            return items
+        queue.Sent(item[1])
+        items.append(item)
+
+
+def test_partial_record(directory):
+    queue = eventqueue.DiskEventQueue(directory)
+    for i in range(5):
+        queue.Append({'n': i})
+    queue.Close()
+
+    # a crash in the middle of the next record
+    path = os.path.join(directory, segments(directory)[-1])
+    size = os.path.getsize(path)
+    with open(path, 'ab') as f:
+        f.write(eventqueue.RECORD_HEADER.pack(100) + b'{"n":')
+
+    queue = eventqueue.DiskEventQueue(directory)
+    check('partial record is truncated on open', os.path.getsize(path) == size)
+    queue.Append({'n': 5})
+    records = [record['n'] for record, position in drain(queue)]
+    check('records replayed in order after the truncation', records == list(range(6)))
+    queue.Close()
+
+
+def test_out_of_order_acks(directory):
+    queue = eventqueue.DiskEventQueue(directory)
+    for i in range(4):
+        queue.Append({'n': i})
+    items = drain(queue)
+    queue.Ack(items[2][1])
+    queue.Ack(items[0][1])
+    check('cursor stops at the first unacknowledged record', queue.Acked == 1)
+    queue.Close()
+
+    queue = eventqueue.DiskEventQueue(directory)
+    items = drain(queue)
+    check('replay resumes after the acknowledged prefix', [record['n'] for record, position in items] == [1, 2, 3])
+    for record, position in reversed(items):
+        queue.Ack(position)
+    check('reversed acks commit everything', queue.Acked == 3 and queue.Inflight() == 0)
+    queue.Close()
+
+    queue = eventqueue.DiskEventQueue(directory)
+    check('nothing left to replay', queue.Next() is None)
+    queue.Close()
+
+
+def test_stale_cursor(directory):
+    queue = eventqueue.DiskEventQueue(directory, segment_size=64)
+    for i in range(10):
+        queue.Append({'n': i})
+    queue.Close()
+    first = segments(directory)[0]
+    with open(os.path.join(directory, eventqueue.CURSOR_FILE), 'w') as f:
+        f.write('%d 12\n' % (int(first[:-len(eventqueue.SEGMENT_SUFFIX)]) + 1000))
+
+    queue = eventqueue.DiskEventQueue(directory, segment_size=64)
+    records = [record['n'] for record, position in drain(queue)]
+    check('cursor into a missing segment restarts at the oldest', records == list(range(10)))
+    queue.Close()
+
+
+def test_eviction(directory):
+    queue = eventqueue.DiskEventQueue(directory, max_bytes=400, segment_size=100)
+    queue.Append({'n': 0, 'pad': 'x' * 40})
+    items = drain(queue)
+    for i in range(1, 20):
+        queue.Append({'n': i, 'pad': 'x' * 40})
+    check('oldest segments are evicted', queue.EvictedSegments > 0)
+    check('evicted records are no longer in flight', queue.Inflight() == 0)
+    queue.Ack(items[0][1])
+    items = drain(queue)
+    records = [record['n'] for record, position in items]
+    check('replay continues with the oldest kept record', records == sorted(records) and records[-1] == 19
+            and 0 < records[0])
+    for record, position in items:
+        queue.Ack(position)
+    queue.Close()
+
+    queue = eventqueue.DiskEventQueue(directory, max_bytes=400, segment_size=100)
+    check('acknowledged records are not replayed after reopen', queue.Next() is None)
+    queue.Close()
+
+
+def main():
+    for test in [test_partial_record, test_out_of_order_acks, test_stale_cursor, test_eviction]:
+        with tempfile.TemporaryDirectory() as directory:
+            test(directory)
+    if failures > 0:
+        print('%d checks failed' % failures)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
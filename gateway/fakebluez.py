@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+#   Simple IOT demo in Linux
+#   Copyright (C) 2019  Jeune Prime M. Origines <primeyo2004@yahoo.com>
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+# Fake BlueZ object tree which is served through the same proxy object API
+# as dbus-python (get_object / get_dbus_method), so that bleclient can be
+# exercised and benchmarked without a bluetooth adapter and tags.
+# Every method call costs a simulated D-Bus round trip.
+
+import dbus
+import socket
+import threading
+import time
+
+import bleclient
+
+
+BLUEZ_ADAPTER_IFACE = 'org.bluez.Adapter1'
+
+INTROSPECT_DOCTYPE  = ('<!DOCTYPE node PUBLIC "-//freedesktop//DTD D-BUS Object Introspection 1.0//EN"\n'
+                       '"http://www.freedesktop.org/standards/dbus/1.0/introspect.dtd">\n')
+
+INTROSPECT_IFACES = {
+    bleclient.DBUS_INTROSPECTABLE_IFACE : (['Introspect'], []),
+    bleclient.DBUS_PROP_IFACE           : (['Get', 'Set', 'GetAll'], []),
+    BLUEZ_ADAPTER_IFACE                 : (['StartDiscovery', 'SetDiscoveryFilter', 'StopDiscovery', 'RemoveDevice'],
+                                           ['Address', 'Name', 'Alias', 'Class', 'Powered', 'Discoverable', 'Pairable', 'UUIDs']),
+    bleclient.BLUEZ_DEVICE_IFACE        : (['Disconnect', 'Connect', 'ConnectProfile', 'DisconnectProfile', 'Pair', 'CancelPairing'],
+                                           ['Address', 'AddressType', 'Name', 'Alias', 'Class', 'Appearance', 'Icon', 'Paired',
+                                            'Trusted', 'Blocked', 'LegacyPairing', 'RSSI', 'Connected', 'UUIDs', 'Modalias',
+                                            'Adapter', 'ManufacturerData', 'ServiceData', 'TxPower', 'ServicesResolved']),
+    bleclient.GATT_SERVICE_IFACE        : ([], ['UUID', 'Device', 'Primary', 'Includes']),
+    bleclient.GATT_CHRC_IFACE           : (['ReadValue', 'WriteValue', 'AcquireWrite', 'AcquireNotify', 'StartNotify', 'StopNotify'],
+                                           ['UUID', 'Service', 'Value', 'Notifying', 'Flags', 'WriteAcquired', 'NotifyAcquired']),
+}
+
+
+FAKE_ATT_MTU        = 23
+
+
+class FakeUnixFd:
+    def __init__(self, fd):
+        self.fd = fd
+
+    def take(self):
+        return self.fd
+
+
+class FakeSignalMatch:
+    def __init__(self, bus, path, signal_name, handler):
+        self.bus = bus
+        self.path = path
+        self.signal_name = signal_name
+        self.handler = handler
+
+    def remove(self):
+        if self in self.bus.SignalMatches:
+            self.bus.SignalMatches.remove(self)
+
+
+class FakeProxyMethod:
+    def __init__(self, proxy, member):
+        self.proxy = proxy
+        self.member = member
+
+    def __call__(self, *args, **kwargs):
+        reply_handler = kwargs.pop('reply_handler', None)
+        error_handler = kwargs.pop('error_handler', None)
+        kwargs.pop('dbus_interface', None)
+        try:
+            result = self.proxy.bus.Dispatch(self.proxy.path, self.member, args)
+        except dbus.exceptions.DBusException as ex:
+            if error_handler is None:
+                raise ex
+            error_handler(ex)
+            return None
+
+        if reply_handler is None:
+            return result
+        if result is None:
+            reply_handler()
+        elif isinstance(result, tuple):
+            reply_handler(*result)
+        else:
+            reply_handler(result)
+
+
+class FakeProxyObject:
+    def __init__(self, bus, path):
+        self.bus = bus
+        self.path = path
+
+    def get_dbus_method(self, member, dbus_interface=None):
+        return FakeProxyMethod(self, member)
+
+    def connect_to_signal(self, signal_name, handler_function, dbus_interface=None, **keywords):
+        match = FakeSignalMatch(self.bus, self.path, signal_name, handler_function)
+        self.bus.SignalMatches.append(match)
+        return match
+
+
+class FakeBluezBus:
+    def __init__(self, latency=0.0002):
+        self.Latency = latency
+        self.Calls = 0
+        self.CallsLock = threading.Lock()
+        self.Objects = {bleclient.BLUEZ_ROOT_PATH : {}}
+        self.Children = {bleclient.BLUEZ_ROOT_PATH : []}
+        self.SignalMatches = []
+        self.WrittenValues = {}
+        self.NotifySockets = {}
+        self.WriteSockets = {}
+
+    def get_object(self, bus_name, path, introspect=True):
+        return FakeProxyObject(self, path)
+
+    def add_signal_receiver(self, handler_function, signal_name=None, dbus_interface=None, path=None, **keywords):
+        match = FakeSignalMatch(self, path, signal_name, handler_function)
+        self.SignalMatches.append(match)
+        return match
+
+    def AddObject(self, path, iface_name, properties):
+        if path not in self.Objects:
+            self.Objects[path] = {}
+            self.Children[path] = []
+            parent, name = path.rsplit('/', 1)
+            parent = parent or bleclient.BLUEZ_ROOT_PATH
+            if parent not in self.Objects:
+                self.AddObject(parent, None, None)
+            self.Children[parent].append(name)
+        if iface_name is not None:
+            self.Objects[path][iface_name] = dict(properties)
+
+    def RemoveObject(self, path):
+        for child in list(self.Children.get(path, [])):
+            self.RemoveObject(path + '/' + child)
+        ifaces = self.Objects.pop(path, {})
+        self.Children.pop(path, None)
+        parent, name = path.rsplit('/', 1)
+        parent = parent or bleclient.BLUEZ_ROOT_PATH
+        if parent in self.Children:
+            self.Children[parent].remove(name)
+        self.EmitSignal(bleclient.BLUEZ_ROOT_PATH, 'InterfacesRemoved', path, list(ifaces.keys()))
+
+    def AddAdapter(self, adapter='hci0'):
+        adapter_path = bleclient.BLUEZ_OBJECT_PATH + '/' + adapter
+        self.AddObject(adapter_path, BLUEZ_ADAPTER_IFACE,
+                {'Address': '00:1A:7D:DA:71:13', 'Name': adapter, 'Alias': adapter, 'Powered': True})
+        return adapter_path
+
+    def AddDevice(self, adapter, address, name='ITAG', connected=True, services=(), rssi=-60):
+        # services is a sequence of (service uuid, [characteristic uuids])
+        adapter_path = bleclient.BLUEZ_OBJECT_PATH + '/' + adapter
+        dev_path = adapter_path + '/dev_' + address.replace(':', '_')
+        self.AddObject(dev_path, bleclient.BLUEZ_DEVICE_IFACE,
+                {'Address': address, 'AddressType': 'public', 'Name': name, 'Alias': name,
+                 'Paired': False, 'Trusted': False, 'Blocked': False, 'LegacyPairing': False,
+                 'RSSI': rssi, 'Connected': connected, 'Adapter': adapter_path,
+                 'UUIDs': [serv_uuid for serv_uuid, chrc_uuids in services],
+                 'ServicesResolved': connected and len(services) > 0})
+        handle = 0x0a
+        for serv_uuid, chrc_uuids in services:
+            serv_path = dev_path + '/service%04x' % handle
+            self.AddObject(serv_path, bleclient.GATT_SERVICE_IFACE,
+                    {'UUID': serv_uuid, 'Device': dev_path, 'Primary': True, 'Includes': []})
+            handle = handle + 1
+            for chrc_uuid in chrc_uuids:
+                chrc_path = serv_path + '/char%04x' % handle
+                self.AddObject(chrc_path, bleclient.GATT_CHRC_IFACE,
+                        {'UUID': chrc_uuid, 'Service': serv_path, 'Value': [0x00],
+                         'Notifying': False, 'Flags': ['read', 'write-without-response', 'write', 'notify'],
+                         'WriteAcquired': False, 'NotifyAcquired': False})
+                handle = handle + 2
+            handle = handle + 1
+        return dev_path
+
+    def AddDevices(self, ndevices, nservices, nchrcs, adapter='hci0'):
+        self.AddAdapter(adapter)
+        dev_paths = []
+        for d in range(ndevices):
+            address = 'FF:FF:%02X:%02X:%02X:%02X' % ((d >> 24) & 0xff, (d >> 16) & 0xff, (d >> 8) & 0xff, d & 0xff)
+            services = []
+            for s in range(nservices):
+                services.append(('%08x-0000-1000-8000-00805f9b34fb' % (0x1800 + s),
+                        ['%08x-0000-1000-8000-00805f9b34fb' % (0x2a00 + s * nchrcs + c) for c in range(nchrcs)]))
+            dev_paths.append(self.AddDevice(adapter, address, services=services))
+        return dev_paths
+
+    def EmitSignal(self, path, signal_name, *args):
+        for match in list(self.SignalMatches):
+            if match.signal_name == signal_name and match.path in (None, path):
+                match.handler(*args)
+
+    def SetProperty(self, path, iface_name, propname, value):
+        self.Objects[path][iface_name][propname] = value
+        self.EmitSignal(path, 'PropertiesChanged', iface_name, {propname: value}, [])
+
+    def Notify(self, path, value):
+        # the peripheral sends a notification of the characteristic value
+        props = self.Objects[path][bleclient.GATT_CHRC_IFACE]
+        props['Value'] = list(value)
+        if path in self.NotifySockets:
+            try:
+                self.NotifySockets[path].send(bytes(value))
+            except OSError:
+                self.NotifySockets.pop(path).close()
+                props['NotifyAcquired'] = False
+        elif props['Notifying']:
+            self.EmitSignal(path, 'PropertiesChanged', bleclient.GATT_CHRC_IFACE, {'Value': list(value)}, [])
+
+    def ReceiveWrites(self, path):
+        # values written by the client through the AcquireWrite socket
+        values = []
+        sock = self.WriteSockets.get(path)
+        while sock is not None:
+            try:
+                value = sock.recv(FAKE_ATT_MTU, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                break
+            if len(value) == 0:
+                break
+            values.append(list(value))
+        self.WrittenValues.setdefault(path, []).extend(values)
+        if len(values) > 0:
+            self.Objects[path][bleclient.GATT_CHRC_IFACE]['Value'] = values[-1]
+        return values
+
+    def Introspect(self, path):
+        doc = [INTROSPECT_DOCTYPE, '<node>\n']
+        for iface_name in [bleclient.DBUS_INTROSPECTABLE_IFACE, bleclient.DBUS_PROP_IFACE] + list(self.Objects[path].keys()):
+            methods, props = INTROSPECT_IFACES.get(iface_name, ([], []))
+            doc.append('<interface name="%s">' % iface_name)
+            for method in methods:
+                doc.append('<method name="%s"><arg name="options" type="a{sv}" direction="in"/></method>' % method)
+            for prop in props:
+                doc.append('<property name="%s" type="v" access="read"></property>' % prop)
+            doc.append('</interface>\n')
+        for child in self.Children[path]:
+            doc.append('<node name="%s"/>\n' % child)
+        doc.append('</node>\n')
+        return ''.join(doc)
+
+    def Dispatch(self, path, member, args):
+        with self.CallsLock:
+            self.Calls = self.Calls + 1
+        if self.Latency:
+            time.sleep(self.Latency)
+
+        if path not in self.Objects:
+            raise dbus.exceptions.DBusException('Method "%s" doesn\'t exist' % member,
+                    name='org.freedesktop.DBus.Error.UnknownObject')
+        ifaces = self.Objects[path]
+
+        if member == 'Introspect':
+            return self.Introspect(path)
+        if member == 'GetManagedObjects':
+            return dict((p, dict((i, dict(props)) for i, props in o.items()))
+                    for p, o in self.Objects.items() if o)
+        if member == 'GetAll':
+            return dict(ifaces.get(args[0], {}))
+        if member == 'Get':
+            props = ifaces.get(args[0], {})
+            if args[1] not in props:
+                raise dbus.exceptions.DBusException('No such property \'%s\'' % args[1],
+                        name='org.freedesktop.DBus.Error.InvalidArgs')
+            return props[args[1]]
+        if member == 'ReadValue':
+            return ifaces[bleclient.GATT_CHRC_IFACE]['Value']
+        if member == 'WriteValue':
+            self.WrittenValues.setdefault(path, []).append(list(args[0]))
+            ifaces[bleclient.GATT_CHRC_IFACE]['Value'] = list(args[0])
+            return None
+        if member in ('StartNotify', 'StopNotify'):
+            self.SetProperty(path, bleclient.GATT_CHRC_IFACE, 'Notifying', member == 'StartNotify')
+            return None
+        if member == 'AcquireNotify':
+            ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            self.NotifySockets[path] = ours
+            ifaces[bleclient.GATT_CHRC_IFACE]['NotifyAcquired'] = True
+            return (FakeUnixFd(theirs.detach()), dbus.UInt16(FAKE_ATT_MTU))
+        if member == 'AcquireWrite':
+            ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            self.WriteSockets[path] = ours
+            ifaces[bleclient.GATT_CHRC_IFACE]['WriteAcquired'] = True
+            return (FakeUnixFd(theirs.detach()), dbus.UInt16(FAKE_ATT_MTU))
+        if member in ('Connect', 'Disconnect'):
+            return None
+
+        raise dbus.exceptions.DBusException('Method "%s" doesn\'t exist' % member,
+                name='org.freedesktop.DBus.Error.UnknownMethod')
+
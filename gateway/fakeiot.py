@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+#   Simple IOT demo in Linux
+#   Copyright (C) 2019  Jeune Prime M. Origines <primeyo2004@yahoo.com>
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+# In-process stand-in of the IBM Watson IoT Platform broker and of the
+# ibmiotf gateway and application clients, so that the gateway and the
+# control application can be run and benchmarked without the platform.
+# The messages are encoded and decoded with the registered codecs and
+# every client delivers them on a thread of its own, like the MQTT client.
+
+import datetime
+import queue
+import threading
+import time
+
+import payloadcodec
+
+
+def topic_match(pattern, value):
+    return pattern == '+' or pattern == value
+
+
+class FakeMessage:
+    def __init__(self, payload):
+        self.payload = payload
+
+
+class FakeCommand:
+    def __init__(self, deviceType, deviceId, command, msgFormat, data, timestamp):
+        self.type      = deviceType
+        self.id        = deviceId
+        self.command   = command
+        self.format    = msgFormat
+        self.data      = data
+        self.timestamp = timestamp
+
+
+class FakeEvent:
+    def __init__(self, deviceType, deviceId, event, msgFormat, data, timestamp):
+        self.deviceType = deviceType
+        self.deviceId   = deviceId
+        self.device     = deviceType + ':' + deviceId
+        self.event      = event
+        self.format     = msgFormat
+        self.data       = data
+        self.timestamp  = timestamp
+
+
+class FakeIotBroker:
+    # routes the events and commands to the subscribed clients after the
+    # given latency in seconds, observers are called with (kind, deviceType,
+    # deviceId, name, data) of every message when it is published
+    def __init__(self, latency=0.0):
+        self.Latency   = latency
+        self.Observers = []
+        self.Messages  = 0
+        self.Bytes     = 0
+        self.__lock    = threading.Lock()
+        self.__clients = []
+
+    def Attach(self, client):
+        with self.__lock:
+            self.__clients.append(client)
+
+    def Detach(self, client):
+        with self.__lock:
+            if client in self.__clients:
+                self.__clients.remove(client)
+
+    def Route(self, kind, deviceType, deviceId, name, msgFormat, data, payload):
+        with self.__lock:
+            self.Messages = self.Messages + 1
+            self.Bytes    = self.Bytes + len(payload)
+            clients = list(self.__clients)
+        for observer in self.Observers:
+            observer(kind, deviceType, deviceId, name, data)
+        for client in clients:
+            if client.Subscribed(kind, deviceType, deviceId, name):
+                client.Post(self.Latency, client.Receive, kind, deviceType, deviceId, name, msgFormat, payload)
+
+
+class FakeIotClient:
+    def __init__(self, broker):
+        self.broker    = broker
+        self.connected = False
+        self.Received  = 0
+        self.codecs    = {payloadcodec.FORMAT_JSON: payloadcodec.get_codec(payloadcodec.FORMAT_JSON)}
+        self.subscriptions = []
+        self.__inbox   = queue.Queue()
+        self.__thread  = None
+
+    def setMessageEncoderModule(self, msgFormat, module):
+        self.codecs[msgFormat] = module
+
+    def connect(self):
+        self.connected = True
+        self.__thread = threading.Thread(target=self.__Run, name='mqtt-%x' % id(self), daemon=True)
+        self.__thread.start()
+        self.broker.Attach(self)
+
+    def disconnect(self):
+        self.broker.Detach(self)
+        self.connected = False
+        if self.__thread is not None:
+            self.__inbox.put(None)
+            self.__thread.join()
+            self.__thread = None
+
+    def Post(self, delay, callback, *args):
+        self.__inbox.put((time.monotonic() + delay, callback, args))
+
+    def __Run(self):
+        while True:
+            item = self.__inbox.get()
+            if item is None:
+                return
+            due, callback, args = item
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                callback(*args)
+            except Exception as ex:
+                print('Fake MQTT client callback failed: %s' % ex)
+
+    def Publish(self, kind, deviceType, deviceId, name, msgFormat, data, on_publish):
+        if not self.connected:
+            return False
+        payload = self.codecs[msgFormat].encode(data, datetime.datetime.now(datetime.timezone.utc))
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        self.broker.Route(kind, deviceType, deviceId, name, msgFormat, data, payload)
+        if on_publish is not None:
+            self.Post(self.broker.Latency, on_publish)
+        return True
+
+    def Decode(self, msgFormat, payload):
+        return self.codecs[msgFormat].decode(FakeMessage(payload))
+
+    def Subscribed(self, kind, deviceType, deviceId, name):
+        for subscription in self.subscriptions:
+            if subscription[0] == kind and topic_match(subscription[1], deviceType) and \
+                    topic_match(subscription[2], deviceId) and topic_match(subscription[3], name):
+                return True
+        return False
+
+
+class FakeGatewayClient(FakeIotClient):
+    # stand-in of ibmiotf.gateway.Client
+    def __init__(self, broker, gatewayType='DEMOGATEWAY_T', gatewayId='GATEWAY_1'):
+        FakeIotClient.__init__(self, broker)
+        self.gatewayType = gatewayType
+        self.gatewayId   = gatewayId
+        self.deviceCommandCallback = None
+
+    def publishDeviceEvent(self, deviceType, deviceId, event, msgFormat, data, qos=0, on_publish=None):
+        return self.Publish('event', deviceType, deviceId, event, msgFormat, data, on_publish)
+
+    def publishGatewayEvent(self, event, msgFormat, data, qos=0, on_publish=None):
+        return self.Publish('event', self.gatewayType, self.gatewayId, event, msgFormat, data, on_publish)
+
+    def subscribeToDeviceCommands(self, deviceType, deviceId='+', command='+', format='json', qos=1):
+        self.subscriptions.append(('command', deviceType, deviceId, command))
+        return True
+
+    def Receive(self, kind, deviceType, deviceId, name, msgFormat, payload):
+        self.Received = self.Received + 1
+        message = self.Decode(msgFormat, payload)
+        if self.deviceCommandCallback is not None:
+            self.deviceCommandCallback(FakeCommand(deviceType, deviceId, name, msgFormat, message.data, message.timestamp))
+
+
+class FakeApplicationClient(FakeIotClient):
+    # stand-in of ibmiotf.application.Client, without device status messages
+    def __init__(self, broker):
+        FakeIotClient.__init__(self, broker)
+        self.deviceEventCallback  = None
+        self.deviceStatusCallback = None
+        self.subscriptionCallback = None
+        self.__msgId = 0
+
+    def __Subscribed(self, qos):
+        self.__msgId = self.__msgId + 1
+        if self.subscriptionCallback is not None:
+            self.Post(self.broker.Latency, self.subscriptionCallback, self.__msgId, [qos])
+        return self.__msgId
+
+    def subscribeToDeviceEvents(self, deviceType='+', deviceId='+', event='+', msgFormat=None, qos=0):
+        self.subscriptions.append(('event', deviceType, deviceId, event))
+        return self.__Subscribed(qos)
+
+    def subscribeToDeviceStatus(self, deviceType='+', deviceId='+'):
+        return self.__Subscribed(0)
+
+    def publishCommand(self, deviceType, deviceId, command, msgFormat, data=None, qos=0, on_publish=None):
+        return self.Publish('command', deviceType, deviceId, command, msgFormat, data, on_publish)
+
+    def Receive(self, kind, deviceType, deviceId, name, msgFormat, payload):
+        self.Received = self.Received + 1
+        message = self.Decode(msgFormat, payload)
+        if self.deviceEventCallback is not None:
+            self.deviceEventCallback(FakeEvent(deviceType, deviceId, name, msgFormat, message.data, message.timestamp))
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+#   Simple IOT demo in Linux
+#   Copyright (C) 2019  Jeune Prime M. Origines <primeyo2004@yahoo.com>
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import tc74
+
+import queue
+import sys
+import threading
+import time
+
+
+class I2CBusWorker(threading.Thread):
+    # reads all the sensors of one bus in a tight batch per tick, the
+    # sensors share one SMBus handle and its transactions are serialized
+    def __init__(self, driver, i2cbus, interval, batches):
+        threading.Thread.__init__(self, name='i2c-%d' % i2cbus, daemon=True)
+        self.Driver   = driver
+        self.I2CBus   = i2cbus
+        self.Interval = interval
+        self.SMBus    = tc74.create_SMBus(driver, i2cbus)
+        self.Lock     = threading.Lock()
+        self.Sensors  = []
+        self.Errors   = 0
+        self.__batches = batches
+        self.__stopEvent = threading.Event()
+
+    def AddSensor(self, key, i2caddr):
+        with self.Lock:
+            sensor = tc74.create_TC74Sensor(self.Driver, self.I2CBus, i2caddr, self.SMBus)
+            self.Sensors.append((key, sensor))
+        return sensor
+
+    def ReadBatch(self):
+        batch = []
+        with self.Lock:
+            for key, sensor in self.Sensors:
+                try:
+                    value = sensor.read()
+                except OSError as ex:
+                    self.Errors = self.Errors + 1
+                    print('Failed to read sensor %s on i2c bus %d: %s' % (key, self.I2CBus, ex), file=sys.stderr)
+                    continue
+                batch.append((key, value, time.time()))
+        return batch
+
+    def run(self):
+        deadline = time.monotonic()
+        while not self.__stopEvent.is_set():
+            batch = self.ReadBatch()
+            if len(batch) > 0:
+                self.__batches.put(batch)
+            deadline = max(deadline + self.Interval, time.monotonic())
+            self.__stopEvent.wait(deadline - time.monotonic())
+
+    def Stop(self):
+        self.__stopEvent.set()
+
+
+class I2CBusScheduler:
+    # one worker thread per bus so that a slow bus doesn't stall the others,
+    # Collect() merges whatever the workers read since the last call
+    def __init__(self, driver, interval):
+        self.Driver   = driver
+        self.Interval = interval
+        self.Workers  = {}
+        self.__batches = queue.SimpleQueue()
+
+    def AddSensor(self, key, i2cbus, i2caddr):
+        worker = self.Workers.get(i2cbus)
+        if worker is None:
+            worker = I2CBusWorker(self.Driver, i2cbus, self.Interval, self.__batches)
+            self.Workers[i2cbus] = worker
+        return worker.AddSensor(key, i2caddr)
+
+    def Sensors(self):
+        sensors = []
+        for worker in self.Workers.values():
+            sensors.extend(worker.Sensors)
+        return sensors
+
+    def Start(self):
+        for worker in self.Workers.values():
+            if not worker.is_alive():
+                worker.start()
+
+    def Stop(self):
+        for worker in self.Workers.values():
+            worker.Stop()
+        for worker in self.Workers.values():
+            if worker.is_alive():
+                worker.join()
+
+    def Collect(self):
+        # list of (key, raw value, timestamp) read by all the buses
+        readings = []
+        while True:
+            try:
+                readings.extend(self.__batches.get_nowait())
+            except queue.Empty:
+                return readings
+
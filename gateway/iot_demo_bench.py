@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+#   Simple IOT demo in Linux
+#   Copyright (C) 2019  Jeune Prime M. Origines <primeyo2004@yahoo.com>
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+# Load generator of the demo: N gateways with M dummy TC74 sensors and M fake
+# ITAG tags each, and the control application, connected through the
+# in-process broker (see fakeiot). Every sensor has a rule on the tag of the
+# same number, the latencies are measured at the broker from the last reading
+# of the sensor to the command, and from the command to the confirmed state.
+#   usage: iot_demo_bench.py [gateways] [devices per gateway] [seconds] [read interval ms] [broker latency ms]
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'application'))
+
+import fakebluez
+import fakeiot
+import i2cscheduler
+import iot_demo_gateway
+import iot_demo_control_application
+import payloadcodec
+
+import contextlib
+import threading
+import time
+
+try:
+  from gi.repository import GObject
+except ImportError:
+  import gobject as GObject
+
+
+BENCH_THRESHOLDS = (40, 70)
+BENCH_BLE_LATENCY = 0.0002
+
+
+def percentiles(values):
+    # (p50, p95, p99, max) in ms
+    if len(values) == 0:
+        return None
+    values = sorted(values)
+    last = len(values) - 1
+    return tuple(values[int(round(p * last))] * 1000 for p in (0.5, 0.95, 0.99, 1.0))
+
+
+class LatencyProbe:
+    # broker observer following reading -> command -> current_state of each tag
+    def __init__(self, sensors):
+        self.Sensors     = sensors
+        self.Readings    = 0
+        self.Commands    = 0
+        self.States      = 0
+        self.ReadingToCommand = []
+        self.CommandToState   = []
+        self.ReadingToState   = []
+        self.__lock      = threading.Lock()
+        self.__lastReading = {}
+        self.__pending   = {}
+
+    def __call__(self, kind, deviceType, deviceId, name, data):
+        now = time.monotonic()
+        with self.__lock:
+            if kind == 'event' and name == 'reading':
+                self.Readings = self.Readings + 1
+                self.__lastReading[(deviceType, deviceId)] = now
+            elif kind == 'event' and name == 'readings':
+                self.Readings = self.Readings + len(data['deviceId'])
+                for sensorId in data['deviceId']:
+                    self.__lastReading[(data['deviceType'], sensorId)] = now
+            elif kind == 'command':
+                self.Commands = self.Commands + 1
+                reading = self.__lastReading.get(self.Sensors.get((deviceType, deviceId)))
+                if reading is not None:
+                    self.ReadingToCommand.append(now - reading)
+                self.__pending[(deviceType, deviceId)] = (data['alarm'], reading, now)
+            elif kind == 'event' and name == 'current_state':
+                self.States = self.States + 1
+                pending = self.__pending.get((deviceType, deviceId))
+                if pending is not None and pending[0] == data['alarm']:
+                    del self.__pending[(deviceType, deviceId)]
+                    self.CommandToState.append(now - pending[2])
+                    if pending[1] is not None:
+                        self.ReadingToState.append(now - pending[1])
+
+
+def build_gateway(broker, index, ndevices):
+    client = fakeiot.FakeGatewayClient(broker, 'DEMOGATEWAY_T', 'GATEWAY_%d' % index)
+    payloadcodec.register_codecs(client)
+    client.connect()
+
+    scheduler = i2cscheduler.I2CBusScheduler('TC74SensorDummy', iot_demo_gateway.TC74_SAMPLE_INTERVAL / 1000)
+    bus = fakebluez.FakeBluezBus(BENCH_BLE_LATENCY)
+    bus.AddAdapter('hci0')
+    for m in range(ndevices):
+        # 8 sensors per i2c bus, as many as the TC74 addresses
+        scheduler.AddSensor('TEMPSENSOR_%d_%d' % (index, m), m // 8 + 1, 0x48 + m % 8)
+        address = 'FF:FF:00:%02X:%02X:%02X' % (index & 0xff, (m >> 8) & 0xff, m & 0xff)
+        bus.AddDevice('hci0', address, services=[(iot_demo_gateway.ITAG_IMMEDIATE_ALERT_SERVICE,
+                [iot_demo_gateway.ITAG_ALERT_LEVEL_CHRC])])
+        iot_demo_gateway.ITAG_DEVICE_IDS[address] = 'ITAG_%d_%d' % (index, m)
+
+    gateway = iot_demo_gateway.SimpleGatewayImpl(scheduler, client)
+    for deviceId, characteristic in iot_demo_gateway.ItagDiscovery(bus).Discover()[0]:
+        gateway.AddActuator(deviceId, characteristic)
+    return gateway, client
+
+
+def main():
+    ngateways = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    ndevices  = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    duration  = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    interval  = int(sys.argv[4]) if len(sys.argv) > 4 else 200
+    latency   = float(sys.argv[5]) / 1000 if len(sys.argv) > 5 else 0.0
+
+    # sawtooth of the dummy sensors sampled fast enough to cross the thresholds
+    iot_demo_gateway.TC74_READ_INTERVAL   = interval
+    iot_demo_gateway.TC74_SAMPLE_INTERVAL = max(interval // 4, 1)
+    iot_demo_gateway.IOT_QUEUE_DIR        = None
+    iot_demo_gateway.ITAG_ACQUIRE_WRITE   = False
+    iot_demo_gateway.BLE_RESCAN_INTERVAL  = None
+    appClass = iot_demo_control_application.SimpleControlApplicationImpl
+    appClass.HISTORY_DIR   = None
+    appClass.ALARM_RULES   = []
+    appClass.COMMAND_RATE  = 1e9
+    appClass.COMMAND_BURST = 1e9
+
+    broker = fakeiot.FakeIotBroker(latency)
+    sensors = {}
+    for g in range(ngateways):
+        for m in range(ndevices):
+            sensors[(appClass.IOT_DEVICE_ACTUATOR_TYPE, 'ITAG_%d_%d' % (g, m))] = \
+                    (appClass.IOT_DEVICE_SENSOR_TYPE, 'TEMPSENSOR_%d_%d' % (g, m))
+    probe = LatencyProbe(sensors)
+    broker.Observers.append(probe)
+
+    print('%d gateways x %d sensors and tags, %.1fs, reading every %dms, broker latency %.1fms' %
+            (ngateways, ndevices, duration, interval, latency * 1000))
+    mainloop = GObject.MainLoop()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        appClient = fakeiot.FakeApplicationClient(broker)
+        payloadcodec.register_codecs(appClient)
+        appClient.connect()
+        appImpl = appClass(appClient)
+        for (actuatorType, actuatorId), (sensorType, sensorId) in sensors.items():
+            appImpl.ruleEngine.AddRule(sensorType, sensorId, actuatorType, actuatorId, BENCH_THRESHOLDS)
+        appImpl.Start()
+
+        gateways = [build_gateway(broker, g, ndevices) for g in range(ngateways)]
+        for gateway, client in gateways:
+            gateway.Start()
+
+        GObject.timeout_add(int(duration * 1000), mainloop.quit)
+        start = time.monotonic()
+        mainloop.run()
+        elapsed = time.monotonic() - start
+
+        for gateway, client in gateways:
+            gateway.Stop()
+            client.disconnect()
+        appClient.disconnect()
+        appImpl.Stop()
+
+    print('readings: %d (%.1f/s), commands: %d (%.1f/s), states: %d (%.1f/s), broker messages: %d, bytes: %d' %
+            (probe.Readings, probe.Readings / elapsed, probe.Commands, probe.Commands / elapsed,
+             probe.States, probe.States / elapsed, broker.Messages, broker.Bytes))
+    for title, values in [('reading -> command', probe.ReadingToCommand),
+                          ('command -> state', probe.CommandToState),
+                          ('reading -> state', probe.ReadingToState)]:
+        result = percentiles(values)
+        if result is None:
+            print('%-18s no samples' % title)
+        else:
+            print('%-18s n=%-6d p50=%8.2fms p95=%8.2fms p99=%8.2fms max=%8.2fms' % ((title, len(values)) + result))
+
+    writers = [device.Device for gateway, client in gateways
+            for device in gateway.deviceRegistry.Devices(gateway.IOT_DEVICE_ACTUATOR_TYPE)]
+    print('actuator writes: %d, coalesced: %d, skipped: %d, retries: %d, failures: %d' %
+            (sum(w.Writes for w in writers), sum(w.Coalesced for w in writers), sum(w.Skipped for w in writers),
+             sum(w.Retries for w in writers), sum(w.Failures for w in writers)))
+    tracker = appImpl.commandTracker
+    print('commands deduplicated: %d, timed out: %d, confirmed: %d' %
+            (tracker.Deduplicated, tracker.TimedOut, tracker.Confirmed))
+    stats = appImpl.eventDispatcher.Stats()
+    print('event workers processed: %d, failed: %d, blocked: %d, max depth: %d' %
+            (sum(s[2] for s in stats), sum(s[3] for s in stats), sum(s[4] for s in stats), max(s[1] for s in stats)))
+
+if __name__ == '__main__':
+    main()
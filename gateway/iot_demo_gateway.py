@@ -17,11 +17,21 @@
 #   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
 
+import actuatorwriter
+import asyncgateway
 import bleclient
+import deviceregistry
+import eventbatcher
+import eventqueue
+import i2cscheduler
+import payloadcodec
+import publishpolicy
 import tc74
 
+import asyncio
 import dbus
 import sys
+import threading
 from dbus.mainloop.glib import DBusGMainLoop
 
 import time
@@ -39,13 +49,54 @@ except ImportError:
 I2C_BUS            = 1
 TC74_I2C_ADDRESS   = 0x4a
 TC74_READ_INTERVAL = 3000
+TC74_SAMPLE_INTERVAL    = 250
+TC74_SAMPLE_BUFFER_SIZE = 64
+TC74_SENSOR_DRIVER      = 'TC74SensorImpl'
+# IoT device id, I2C bus and address of each TC74 sensor
+TC74_SENSORS            = [('TEMPSENSOR_1', I2C_BUS, TC74_I2C_ADDRESS)]
+# payload format of the published events, payloadcodec.FORMAT_BINARY is more compact
+IOT_EVENT_FORMAT        = payloadcodec.FORMAT_JSON
+# publish the readings in batches per device type instead of one event per reading
+IOT_EVENT_BATCHING      = False
+IOT_BATCH_MAX_SIZE      = 100
+IOT_BATCH_MAX_AGE       = 5000
+IOT_BATCH_QOS           = 1
+# events published while the broker is unreachable are kept in this queue
+# directory and replayed on reconnect, set to None to drop them instead
+IOT_QUEUE_DIR           = './iot_demo_gateway_queue'
+IOT_QUEUE_MAX_BYTES     = 64 * 1024 * 1024
+IOT_QUEUE_REPLAY_RATE   = 50
+IOT_QUEUE_SYNC_INTERVAL = 1000
+IOT_QUEUE_ACK_TIMEOUT   = 30000
+# report by exception, a reading is only published when it moved out of the
+# deadband of the last published one or after max_silence seconds (heartbeat),
+# IOT_REPORT_POLICIES overrides it per device id, set to None to publish all.
+# The heartbeat keeps several readings in the 120 s statistics window of the
+# control application and retries its rate limited commands in time
+IOT_REPORT_POLICY       = publishpolicy.DeadbandPolicy(absolute=0.5, max_silence=30, min_interval=0)
+IOT_REPORT_POLICIES     = {}
  #
 ITAG_IMMEDIATE_ALERT_SERVICE = "00001802-0000-1000-8000-00805f9b34fb"
 ITAG_ALERT_LEVEL_CHRC        = "00002a06-0000-1000-8000-00805f9b34fb"
-
-
-
-  IOT_ORGANIZATION = ""
+ITAG_ACQUIRE_WRITE           = True
+# retries with exponential backoff of a failed Alert Level write
+ITAG_WRITE_RETRIES           = 5
+ITAG_WRITE_BACKOFF           = 500
+ITAG_DEVICE_FILTER           = bleclient.DeviceFilter(name='ITAG', connected=True)
+# set to a file name e.g. './iot_demo_gateway_gatt.json' to skip the GATT walk on warm start
+BLE_GATT_CACHE_FILE          = None
+# IoT device id of the tags by BLE address, the others are numbered ITAG_ALARM_<n>
+# in the order they are found
+ITAG_DEVICE_IDS              = {}
+# interval of the scan for newly connected tags, set to None to only scan at start
+BLE_RESCAN_INTERVAL          = 30000
+# 'asyncio' runs the gateway as asyncio tasks with the GObject main loop in a
+# thread of its own, so that a slow D-Bus call or publish doesn't stall the rest
+GATEWAY_RUNTIME              = 'gobject'
+
+
+
+#   IOT_ORGANIZATION = ""
 #   IOT_GATEWAYTYPE  = ""
 #   IOT_GATEWAYID    = ""
 #   IOT_AUTHMETHOD   = ""
@@ -62,45 +113,210 @@ class SimpleGatewayImpl:
     IOT_DEVICE_ACTUATOR_TYPE = "DEMOACTUATOR_T"
     IOT_DEVICE_ACTUATOR_ID   = "ITAG_ALARM_1"
     IOT_EVENT_READING        = "reading"
+    IOT_EVENT_READINGS       = "readings"
     IOT_EVENT_CURRENT_STATE  = "current_state"
     IOT_CMD_NEW_STATE        = "new_state"
 
 
 
  
-    def __init__(self, temp_sensor, itag_device, iot_gateway):
-        self.sensorDevice   = temp_sensor
-        self.actuatorDevice = itag_device
+    def __init__(self, sensor_scheduler, iot_gateway, actuator_discovery=None):
+        self.sensorScheduler = sensor_scheduler
+        self.deviceRegistry  = deviceregistry.DeviceRegistry()
+        self.deviceRegistry.AddCommandHandler(self.IOT_DEVICE_ACTUATOR_TYPE, self.IOT_CMD_NEW_STATE,
+                self.__NewStateCommandHandler)
+        for deviceId, sensor in sensor_scheduler.Sensors():
+            self.__RegisterSensor(deviceId, sensor)
+        self.actuatorDiscovery = actuator_discovery
+        self.rescanThread   = None
         self.iotGateway     = iot_gateway
-        self.alarmValue     = 0
+        self.started        = False
+        self.actuatorStateCallback = self.PublishActuatorState
+        self.eventQueue     = None
+        self.iotPublisher   = iot_gateway
+        if IOT_QUEUE_DIR is not None:
+            self.eventQueue   = eventqueue.DiskEventQueue(IOT_QUEUE_DIR, max_bytes=IOT_QUEUE_MAX_BYTES)
+            self.iotPublisher = eventqueue.StoreAndForwardPublisher(iot_gateway, self.eventQueue,
+                    replay_rate=IOT_QUEUE_REPLAY_RATE, ack_timeout=IOT_QUEUE_ACK_TIMEOUT / 1000)
+        self.eventBatcher   = None
+        if IOT_EVENT_BATCHING:
+            self.eventBatcher = eventbatcher.EventBatcher(self.iotPublisher, self.IOT_EVENT_READINGS,
+                    max_size=IOT_BATCH_MAX_SIZE, max_age=IOT_BATCH_MAX_AGE / 1000, qos=IOT_BATCH_QOS,
+                    msg_format=IOT_EVENT_FORMAT)
+        self.reportPolicy   = None
+        if IOT_REPORT_POLICY is not None:
+            self.reportPolicy = publishpolicy.ReportByException(IOT_REPORT_POLICY, IOT_REPORT_POLICIES)
 
     def Start(self):
-        self.__ItagWriteValueCallback()
+        self.StartDevices(self.__ActuatorCommandHandler)
+        GObject.timeout_add(TC74_SAMPLE_INTERVAL,self.__SensorBatchHandler)
+        GObject.timeout_add(TC74_READ_INTERVAL,self.__SensorReadHandler)
+        for interval, callback in self.Timers():
+            GObject.timeout_add(interval,callback)
+        if self.actuatorDiscovery is not None and BLE_RESCAN_INTERVAL is not None:
+            GObject.timeout_add(BLE_RESCAN_INTERVAL,self.Rescan)
+
+    def StartDevices(self, command_callback):
+        for device in self.deviceRegistry.Devices(self.IOT_DEVICE_ACTUATOR_TYPE):
+            self.PublishActuatorState(device)
+        # one subscription for the commands of all the actuators, even the ones added later
         self.iotGateway.subscribeToDeviceCommands(deviceType=self.IOT_DEVICE_ACTUATOR_TYPE, 
-                deviceId=self.IOT_DEVICE_ACTUATOR_ID, 
+                deviceId=deviceregistry.DEVICE_ANY, 
                 command=self.IOT_CMD_NEW_STATE,
                 format='json',qos=2)
 
-        self.iotGateway.deviceCommandCallback = self.__ActuatorCommandHandler
-
-        GObject.timeout_add(TC74_READ_INTERVAL,self.__SensorReadHandler)
+        self.iotGateway.deviceCommandCallback = command_callback
+
+        self.sensorScheduler.Start()
+        self.started = True
+
+    def __RegisterSensor(self, deviceId, sensor):
+        # sampler and its sample count at the last published reading
+        device = self.deviceRegistry.Add(self.IOT_DEVICE_SENSOR_TYPE, deviceId,
+                tc74.TC74Sampler(sensor, TC74_SAMPLE_BUFFER_SIZE))
+        device.State['published'] = 0
+        return device
+
+    def AddSensor(self, deviceId, i2cbus, i2caddr):
+        sensor = self.sensorScheduler.AddSensor(deviceId, i2cbus, i2caddr)
+        device = self.__RegisterSensor(deviceId, sensor)
+        if self.started:
+            self.sensorScheduler.Start()
+        return device
+
+    def AddActuator(self, deviceId, characteristic):
+        # the characteristic is written through a writer of its own which
+        # coalesces the commands and retries the failed writes
+        device = self.deviceRegistry.Add(self.IOT_DEVICE_ACTUATOR_TYPE, deviceId, None)
+        device.Device = actuatorwriter.ActuatorWriter(characteristic,
+                lambda value: self.__ActuatorStateConfirmed(device, value),
+                max_retries=ITAG_WRITE_RETRIES, backoff=ITAG_WRITE_BACKOFF / 1000)
+        device.State.setdefault('alarm', 0)
+        print('Serving ITAG Alert Level of', deviceId)
+        return device
+
+    def __CloseActuator(self, device):
+        device.Device.Close()
+        if isinstance(device.Device.Characteristic, bleclient.BluezWriteChannel):
+            device.Device.Characteristic.Close()
+
+    def RemoveActuator(self, deviceId):
+        device = self.deviceRegistry.Remove(self.IOT_DEVICE_ACTUATOR_TYPE, deviceId)
+        if device is not None:
+            self.__CloseActuator(device)
+            print('ITAG', deviceId, 'is no longer connected')
+        return device
+
+    def UpdateActuators(self, found, gone):
+        # applies a discovery scan in the main loop thread, a tag found again
+        # while still registered reconnected and gets its last state written
+        # back, returns False so that it can be scheduled with GObject.idle_add
+        for deviceId in gone:
+            self.RemoveActuator(deviceId)
+        for deviceId, characteristic in found:
+            previous = self.deviceRegistry.Get(self.IOT_DEVICE_ACTUATOR_TYPE, deviceId)
+            if previous is not None:
+                self.__CloseActuator(previous)
+            device = self.AddActuator(deviceId, characteristic)
+            if previous is not None:
+                device.Device.Set(device.State['alarm'])
+            else:
+                self.actuatorStateCallback(device)
+        return False
+
+    def Rescan(self):
+        # timeout callback, the discovery does blocking D-Bus calls so it runs
+        # in a thread of its own and its result is applied in the main loop
+        if self.rescanThread is None or not self.rescanThread.is_alive():
+            self.rescanThread = threading.Thread(target=self.__RescanWorker, name='rescan', daemon=True)
+            self.rescanThread.start()
+        return True
 
-   
-    def __SensorReadHandler(self):
-        value = self.sensorDevice.read()
-        print ('Read temperature:', int(value))
+    def __RescanWorker(self):
+        try:
+            found, gone = self.actuatorDiscovery.Discover()
+        except dbus.exceptions.DBusException as ex:
+            print('ITAG rescan failed: ' + str(ex), file=sys.stderr)
+            return
+        GObject.idle_add(self.UpdateActuators, found, gone)
+
+    def Timers(self):
+        # (interval in ms, callback) of the periodic publishing housekeeping
+        timers = []
+        if self.eventBatcher is not None:
+            timers.append((max(IOT_BATCH_MAX_AGE // 4, 1), self.eventBatcher.Poll))
+        if self.eventQueue is not None:
+            timers.append((100, self.iotPublisher.Replay))
+            timers.append((IOT_QUEUE_SYNC_INTERVAL, self.eventQueue.Sync))
+        return timers
+
+    def Stop(self):
+        self.sensorScheduler.Stop()
+        for device in self.deviceRegistry.Devices(self.IOT_DEVICE_ACTUATOR_TYPE):
+            writer = device.Device
+            writer.Close()
+            print('%s writes: %d, coalesced: %d, skipped: %d, retries: %d' %
+                    (device.DeviceId, writer.Writes, writer.Coalesced, writer.Skipped, writer.Retries))
+        if self.reportPolicy is not None:
+            print('Readings reported: %d, suppressed: %d' % (self.reportPolicy.Reported, self.reportPolicy.Suppressed))
+            for deviceId, suppressed in sorted(self.reportPolicy.DeviceSuppressed.items()):
+                print('  %s suppressed: %d' % (deviceId, suppressed))
+        if self.eventBatcher is not None:
+            self.eventBatcher.Flush()
+        if self.eventQueue is not None:
+            self.eventQueue.Close()
+
+    def CollectSamples(self):
+        # samples read by the i2c bus workers since the last tick
+        for deviceId, raw, timestamp in self.sensorScheduler.Collect():
+            device = self.deviceRegistry.Get(self.IOT_DEVICE_SENSOR_TYPE, deviceId)
+            if device is not None:
+                device.Device.Add(raw, timestamp)
+
+    def Readings(self):
+        # (deviceId, readingData, timestamp) of the mean of the samples taken
+        # since the last reading, of the devices whose reading is to be published
+        readings = []
+        for device in self.deviceRegistry.Devices(self.IOT_DEVICE_SENSOR_TYPE):
+            deviceId = device.DeviceId
+            samples  = device.Device.Buffer
+            if samples.Count == device.State['published']:
+                print ('No new temperature sample from', deviceId)
+                continue
+            value = round(samples.Mean(samples.Count - device.State['published']), 1)
+            device.State['published'] = samples.Count
+            print ('Read temperature:', value, 'from', deviceId)
+
+            readingData = {'temperature' : value}
+            if self.reportPolicy is not None and not self.reportPolicy.Check(deviceId, readingData):
+                continue
+            readings.append((deviceId, readingData, samples.Timestamps(1)[0][0]))
+        return readings
+
+    def PublishReading(self, deviceId, readingData, timestamp):
+        if self.eventBatcher is not None:
+            self.eventBatcher.Add(self.IOT_DEVICE_SENSOR_TYPE, deviceId, readingData, timestamp)
+            return
+
+        # the sample time goes with the reading, it may be replayed much later
         print ('Publishing temperature reading.')
-
-        readingData = {'temperature' : value}
-        deviceSuccess = self.iotGateway.publishDeviceEvent(self.IOT_DEVICE_SENSOR_TYPE, 
-                self.IOT_DEVICE_SENSOR_ID, 
-                self.IOT_EVENT_READING, "json", 
-                readingData, qos=1, 
+        eventData = dict(readingData, timestamp=round(timestamp, 3))
+        deviceSuccess = self.iotPublisher.publishDeviceEvent(self.IOT_DEVICE_SENSOR_TYPE, 
+                deviceId, 
+                self.IOT_EVENT_READING, IOT_EVENT_FORMAT, 
+                eventData, qos=1, 
                 on_publish=self.__PublishSensorCallback)
-        
+    
         if not deviceSuccess:
             print("Gateway not connected to IBM Watson IoT Platform while publishing from Gateway on behalf of a device")
-    
+
+    def __SensorBatchHandler(self):
+        self.CollectSamples()
+        return True
+   
+    def __SensorReadHandler(self):
+        for deviceId, readingData, timestamp in self.Readings():
+            self.PublishReading(deviceId, readingData, timestamp)
         return True
 
     def __PublishSensorCallback(self):
@@ -109,44 +325,124 @@ class SimpleGatewayImpl:
     def __PublishActuatorStateCallback(self):
         print('Publish ITAG Alert level successful!')
 
-    def __ActuatorCommandHandler(self,command):
+    def AcceptCommand(self, command):
+        # (registered actuator, desired value) for the command, or None
+        return self.deviceRegistry.Dispatch(command)
+
+    def SubmitCommand(self, device, value):
+        # the writers live in the GObject main loop thread, may be called from any thread
+        GObject.idle_add(device.Device.Set, value)
+
+    def __NewStateCommandHandler(self, device, command):
         print("Id = %s (of type = %s) received the device command %s at %s" % (command.id, command.type, command.data, command.timestamp))
         print("Setting ITAG  Alert Level value to: ", command.data['alarm'])
-        self.alarmValue = int(command.data['alarm']) 
-        self.actuatorDevice.WriteValue([self.alarmValue] ,
-                reply_handler=self.__ItagWriteValueCallback, 
-                error_handler=self.__generic_error_cb)
+        return int(command.data['alarm'])
+
+    def __ActuatorCommandHandler(self,command):
+        accepted = self.AcceptCommand(command)
+        if accepted is not None:
+            self.SubmitCommand(*accepted)
 
 
     def __PublishActuatorCallback(self):
         print('Publish actuator successful!')
 
-    def __ItagWriteValueCallback(self):
-        print("ITAG  Alert Level value succesfully set.")
-        stateData = {'alarm' : self.alarmValue}
-        print("Publishing new ITAG Alert Level value = ", self.alarmValue)
-        self.iotGateway.publishDeviceEvent(self.IOT_DEVICE_ACTUATOR_TYPE, 
-                self.IOT_DEVICE_ACTUATOR_ID, 
+    def __ActuatorStateConfirmed(self, device, value):
+        if value != device.State['alarm']:
+            print("ITAG  Alert Level value succesfully set.")
+        device.State['alarm'] = value
+        self.actuatorStateCallback(device)
+
+    def PublishActuatorState(self, device):
+        stateData = {'alarm' : device.State['alarm']}
+        print("Publishing new ITAG Alert Level value = ", device.State['alarm'], 'of', device.DeviceId)
+        self.iotPublisher.publishDeviceEvent(device.DeviceType, 
+                device.DeviceId, 
                 self.IOT_EVENT_CURRENT_STATE, 
-                "json", 
+                IOT_EVENT_FORMAT, 
                 stateData,
                 qos=1, 
                 on_publish=self.__PublishActuatorStateCallback)
 
 
-    def __generic_error_cb(self, error):
-        print('D-Bus call failed: ' + str(error))
 
 
 
-def filter_connected_itag (dev):
-    if dev.Name == 'ITAG':
-        if dev.Connected:
-            return True
-    return False
 
 
 
+class ItagDiscovery:
+    # finds the connected ITAG tags and their Alert Level characteristic, the
+    # IoT device id of a tag stays the same across its reconnections
+    def __init__(self, bus, gatt_cache=None):
+        self.bus       = bus
+        self.gattCache = gatt_cache
+        self.deviceIds = {}
+        # address of the tags found by the last scan: (characteristic path,
+        # whether the write channel acquired the characteristic)
+        self.connected = {}
+
+    def __NewDeviceId(self, address):
+        if address in ITAG_DEVICE_IDS:
+            return ITAG_DEVICE_IDS[address]
+        used   = set(self.deviceIds.values()) | set(ITAG_DEVICE_IDS.values())
+        number = 1
+        while 'ITAG_ALARM_%d' % number in used:
+            number = number + 1
+        return 'ITAG_ALARM_%d' % number
+
+    def __Lost(self, previous, characteristic):
+        # the tag reconnected since the last scan when its characteristic
+        # moved or bluez released the write we had acquired
+        path, acquired = previous
+        return characteristic.Path != path or (acquired and not characteristic.WriteAcquired)
+
+    def Discover(self):
+        # ([(IoT device id, Alert Level characteristic or write channel)] of
+        # the tags connected or reconnected since the last scan, [IoT device
+        # id] of the tags no longer connected), blocking D-Bus calls
+        if self.gattCache is not None:
+            bluezdevs = bleclient.FetchDevices(self.bus, ITAG_DEVICE_FILTER, gatt_cache=self.gattCache)
+        else:
+            bluezdevs = bleclient.FetchDevices(self.bus, ITAG_DEVICE_FILTER, loader=bleclient.LOADER_OBJECT_MANAGER)
+
+        found = []
+        connected = {}
+        for bluezdev in bluezdevs:
+            address = str(bluezdev.Address)
+
+            bleService = bluezdev.GetService(ITAG_IMMEDIATE_ALERT_SERVICE)
+            if bleService is None:
+                print ('Unable to find Immediate Alert service in the connected ITAG device', address, file=sys.stderr)
+                continue
+
+            characteristic = bleService.GetCharactristic(ITAG_ALERT_LEVEL_CHRC)
+            if characteristic is None:
+                print ('Unable to find Alert Level characteristic in Immediate Alert service in the connected ITAG device', address, file=sys.stderr)
+                continue
+
+            previous = self.connected.get(address)
+            if previous is not None and not self.__Lost(previous, characteristic):
+                connected[address] = previous
+                continue
+
+            # Write the alert level through the AcquireWrite socket when supported
+            actuatorDevice = characteristic
+            acquired = False
+            if ITAG_ACQUIRE_WRITE:
+                actuatorDevice = characteristic.CreateWriteChannel()
+                acquired = actuatorDevice.Fd is not None
+
+            deviceId = self.deviceIds.get(address)
+            if deviceId is None:
+                deviceId = self.__NewDeviceId(address)
+                self.deviceIds[address] = deviceId
+            connected[address] = (characteristic.Path, acquired)
+            found.append((deviceId, actuatorDevice))
+
+        gone = [self.deviceIds[address] for address in self.connected if address not in connected]
+        self.connected = connected
+        return found, gone
 
 
 def main():
@@ -158,14 +454,15 @@ def main():
     bus = dbus.SystemBus()
     mainloop = GObject.MainLoop()
 
-    sensorDevice   = None
-    actuatorDevice = None
-    iotGateway     = None
+    sensorScheduler = None
+    iotGateway      = None
 
 
-    # Initialize the TC74 temperature sensor
+    # Initialize the TC74 temperature sensors, the ones on the same bus share its handle
     try:
-        sensorDevice = tc74.create_TC74Sensor('TC74SensorImpl',I2C_BUS,TC74_I2C_ADDRESS)
+        sensorScheduler = i2cscheduler.I2CBusScheduler(TC74_SENSOR_DRIVER, TC74_SAMPLE_INTERVAL / 1000)
+        for deviceId, i2cbus, i2caddr in TC74_SENSORS:
+            sensorScheduler.AddSensor(deviceId, i2cbus, i2caddr)
     except Exception as ex:
         if type(ex) == OSError and ex.errno == 121:
             print('Failed to initialize TC74 sensor',file=sys.stderr) 
@@ -174,23 +471,16 @@ def main():
         sys.exit(1) 
            
 
-    # Fetch the ITAG BLE Alarm
-    bluezdevs = bleclient.FetchDevices(bus, filter_connected_itag)
-    if len(bluezdevs) == 0:
+    # Fetch the ITAG BLE Alarms
+    gattCache = None
+    if BLE_GATT_CACHE_FILE is not None:
+        gattCache = bleclient.GattCache(BLE_GATT_CACHE_FILE)
+    itagDiscovery = ItagDiscovery(bus, gattCache)
+    itags, gone = itagDiscovery.Discover()
+    if len(itags) == 0:
         print ('Unable to find the connected ITAG device.',file=sys.stderr)
         sys.exit(1) 
 
-    bleService = bluezdevs[0].GetService(ITAG_IMMEDIATE_ALERT_SERVICE)
-    if bleService is None:
-        print ('Unable to find Immediate Alert service in the conncted ITAG device.',file=sys.stderr)
-        sys.exit(1) 
-
-
-    actuatorDevice = bleService.GetCharactristic(ITAG_ALERT_LEVEL_CHRC)
-    if actuatorDevice is None:
-        print ('Unable to find Alert Level characteristic in Immediate Alert service in the conncted ITAG device.',file=sys.stderr)
-        sys.exit(1) 
-
 
     # Connect to IBM Watson IOT Platform
     try:
@@ -202,6 +492,7 @@ def main():
             #                         "auth-token"   : IOT_AUTHTOKEN}
             iotGatewayOptions   = ibmiotf.device.ParseConfigFile('./iot_demo_gateway.cfg')
             iotGateway        = ibmiotf.gateway.Client(iotGatewayOptions)
+            payloadcodec.register_codecs(iotGateway)
             iotGateway.connect()
     except Exception as e:
             print("Caught exception connecting device: %s" % str(e))
@@ -209,15 +500,31 @@ def main():
 
 
 
-    gatewayImpl = SimpleGatewayImpl(sensorDevice, actuatorDevice, iotGateway)
-    gatewayImpl.Start()
-
-
-    try:
-        mainloop.run()
-    except KeyboardInterrupt:
-        mainloop.quit()
-
+    gatewayImpl = SimpleGatewayImpl(sensorScheduler, iotGateway, itagDiscovery)
+    for deviceId, actuatorDevice in itags:
+        gatewayImpl.AddActuator(deviceId, actuatorDevice)
+
+    if GATEWAY_RUNTIME == 'asyncio':
+        runtime = asyncgateway.AsyncGatewayRuntime(gatewayImpl,
+                TC74_SAMPLE_INTERVAL / 1000, TC74_READ_INTERVAL / 1000,
+                rescan_interval=BLE_RESCAN_INTERVAL / 1000 if BLE_RESCAN_INTERVAL is not None else None)
+        try:
+            asyncio.run(runtime.Run())
+        except KeyboardInterrupt:
+            pass
+        except Exception as ex:
+            print('Gateway runtime failed: %s' % ex, file=sys.stderr)
+        print('Readings stalled: %d, commands dropped: %d, failed: %d' %
+                (runtime.ReadingsStalled, runtime.CommandsDropped, runtime.Failed))
+    else:
+        gatewayImpl.Start()
+
+        try:
+            mainloop.run()
+        except KeyboardInterrupt:
+            mainloop.quit()
+
+    gatewayImpl.Stop()
     iotGateway.disconnect()
     print('Exiting demo gateway...')
 
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+#   Simple IOT demo in Linux
+#   Copyright (C) 2019  Jeune Prime M. Origines <primeyo2004@yahoo.com>
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+# Message codecs shared by the gateway and the control application, they
+# follow the ibmiotf codec module interface (encode/decode) and are
+# registered with setMessageEncoderModule() under their format name.
+
+import datetime
+import json
+import struct
+
+import ibmiotf
+
+
+FORMAT_JSON   = 'json'
+FORMAT_BINARY = 'bin'
+
+BINARY_VERSION      = 1
+BINARY_KIND_JSON    = 0
+BINARY_KIND_READING = 1
+BINARY_KIND_BATCH   = 2
+
+# fixed point scale of the known reading fields, the index is the field id
+BINARY_FIELDS       = ['temperature', 'alarm']
+BINARY_FIELD_SCALES = {'temperature': 10, 'alarm': 1}
+BINARY_FLOAT_SCALE  = 1000
+
+BINARY_HEADER       = struct.Struct('<BB')
+BINARY_READING      = struct.Struct('<QB')
+BINARY_FIELD        = struct.Struct('<Bi')
+
+
+def to_datetime(timestamp_ms):
+    return datetime.datetime.fromtimestamp(timestamp_ms / 1000, datetime.timezone.utc)
+
+def to_timestamp_ms(timestamp):
+    if timestamp is None:
+        timestamp = datetime.datetime.now(datetime.timezone.utc)
+    if isinstance(timestamp, datetime.datetime):
+        return int(round(timestamp.timestamp() * 1000))
+    return int(round(timestamp * 1000))
+
+def put_varint(buf, value):
+    while value >= 0x80:
+        buf.append((value & 0x7f) | 0x80)
+        value = value >> 7
+    buf.append(value)
+
+def get_varint(payload, offset):
+    value = 0
+    shift = 0
+    while True:
+        byte = payload[offset]
+        offset = offset + 1
+        value = value | ((byte & 0x7f) << shift)
+        if byte < 0x80:
+            return value, offset
+        shift = shift + 7
+
+def put_svarint(buf, value):
+    # zigzag encoding keeps small negative deltas small
+    put_varint(buf, value << 1 if value >= 0 else ((-value) << 1) - 1)
+
+def get_svarint(payload, offset):
+    value, offset = get_varint(payload, offset)
+    return (value >> 1) ^ -(value & 1), offset
+
+def put_string(buf, value):
+    encoded = value.encode('utf-8')
+    put_varint(buf, len(encoded))
+    buf.extend(encoded)
+
+def get_string(payload, offset):
+    length, offset = get_varint(payload, offset)
+    return payload[offset:offset + length].decode('utf-8'), offset + length
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class JsonCodec:
+    def encode(self, data=None, timestamp=None):
+        return json.dumps(data)
+
+    def decode(self, message):
+        data = json.loads(message.payload.decode('utf-8'))
+        return ibmiotf.Message(data, datetime.datetime.now(datetime.timezone.utc))
+
+
+class BinaryCodec:
+    # single readings of the known fields are struct packed with the reading
+    # timestamp, batches of readings (see eventbatcher) are packed in columns
+    # as varint deltas, anything else is carried as JSON
+    def encode(self, data=None, timestamp=None):
+        if self.__IsBatch(data):
+            payload = self.EncodeBatch(data)
+        else:
+            payload = self.EncodeReading(data, to_timestamp_ms(timestamp))
+        if payload is None:
+            payload = BINARY_HEADER.pack(BINARY_VERSION, BINARY_KIND_JSON) + json.dumps(data).encode('utf-8')
+        return payload
+
+    def decode(self, message):
+        payload = message.payload
+        version, kind = BINARY_HEADER.unpack_from(payload)
+        if version != BINARY_VERSION:
+            raise ValueError('Unsupported binary payload version %d' % version)
+        if kind == BINARY_KIND_READING:
+            data, timestamp_ms = self.DecodeReading(payload)
+            return ibmiotf.Message(data, to_datetime(timestamp_ms))
+        if kind == BINARY_KIND_BATCH:
+            data = self.DecodeBatch(payload)
+        else:
+            data = json.loads(payload[BINARY_HEADER.size:].decode('utf-8'))
+        return ibmiotf.Message(data, datetime.datetime.now(datetime.timezone.utc))
+
+    def __IsBatch(self, data):
+        return isinstance(data, dict) and isinstance(data.get('deviceId'), list) \
+                and isinstance(data.get('timestamp'), list)
+
+    def EncodeReading(self, data, timestamp_ms):
+        # the sample time of a reading, when it has one, is the header timestamp
+        if not isinstance(data, dict) or len(data) > 255:
+            return None
+        fields = []
+        for name, value in data.items():
+            if name == 'timestamp' and is_number(value):
+                timestamp_ms = to_timestamp_ms(value)
+                continue
+            if name not in BINARY_FIELD_SCALES or not is_number(value):
+                return None
+            scaled = int(round(value * BINARY_FIELD_SCALES[name]))
+            if not -0x80000000 <= scaled <= 0x7fffffff:
+                return None
+            fields.append(BINARY_FIELD.pack(BINARY_FIELDS.index(name), scaled))
+        return BINARY_HEADER.pack(BINARY_VERSION, BINARY_KIND_READING) + \
+                BINARY_READING.pack(timestamp_ms, len(fields)) + b''.join(fields)
+
+    def DecodeReading(self, payload):
+        offset = BINARY_HEADER.size
+        timestamp_ms, count = BINARY_READING.unpack_from(payload, offset)
+        offset = offset + BINARY_READING.size
+        data = {}
+        for i in range(count):
+            field, scaled = BINARY_FIELD.unpack_from(payload, offset)
+            offset = offset + BINARY_FIELD.size
+            name = BINARY_FIELDS[field]
+            scale = BINARY_FIELD_SCALES[name]
+            data[name] = scaled if scale == 1 else scaled / scale
+        return data, timestamp_ms
+
+    def EncodeBatch(self, data):
+        deviceIds  = data['deviceId']
+        timestamps = data['timestamp']
+        columns    = [(name, values) for name, values in data.items()
+                if name not in ('deviceType', 'deviceId', 'timestamp')]
+        count = len(deviceIds)
+        if not isinstance(data.get('deviceType'), str) or len(timestamps) != count:
+            return None
+        for name, values in columns:
+            if not isinstance(values, list) or len(values) != count or \
+                    not all(value is None or is_number(value) for value in values):
+                return None
+
+        buf = bytearray(BINARY_HEADER.pack(BINARY_VERSION, BINARY_KIND_BATCH))
+        put_varint(buf, count)
+        put_string(buf, data['deviceType'])
+
+        # device ids as indexes into a table of the distinct ids
+        idTable = {}
+        for deviceId in deviceIds:
+            idTable.setdefault(deviceId, len(idTable))
+        put_varint(buf, len(idTable))
+        for deviceId in idTable:
+            put_string(buf, deviceId)
+        for deviceId in deviceIds:
+            put_varint(buf, idTable[deviceId])
+
+        previous = 0
+        for timestamp in timestamps:
+            timestamp_ms = to_timestamp_ms(timestamp)
+            put_svarint(buf, timestamp_ms - previous)
+            previous = timestamp_ms
+
+        put_varint(buf, len(columns))
+        for name, values in columns:
+            scale = BINARY_FIELD_SCALES.get(name)
+            if scale is None:
+                scale = 1 if all(value is None or isinstance(value, int) for value in values) else BINARY_FLOAT_SCALE
+            put_string(buf, name)
+            put_varint(buf, scale)
+            # presence bitmap followed by the deltas of the present values
+            bitmap = bytearray((count + 7) // 8)
+            for i, value in enumerate(values):
+                if value is not None:
+                    bitmap[i // 8] = bitmap[i // 8] | (1 << (i % 8))
+            buf.extend(bitmap)
+            previous = 0
+            for value in values:
+                if value is not None:
+                    scaled = int(round(value * scale))
+                    put_svarint(buf, scaled - previous)
+                    previous = scaled
+        return bytes(buf)
+
+    def DecodeBatch(self, payload):
+        offset = BINARY_HEADER.size
+        count, offset = get_varint(payload, offset)
+        deviceType, offset = get_string(payload, offset)
+
+        ntable, offset = get_varint(payload, offset)
+        idTable = []
+        for i in range(ntable):
+            deviceId, offset = get_string(payload, offset)
+            idTable.append(deviceId)
+        deviceIds = []
+        for i in range(count):
+            index, offset = get_varint(payload, offset)
+            deviceIds.append(idTable[index])
+
+        timestamps = []
+        previous = 0
+        for i in range(count):
+            delta, offset = get_svarint(payload, offset)
+            previous = previous + delta
+            timestamps.append(previous / 1000)
+
+        data = {'deviceType': deviceType, 'deviceId': deviceIds, 'timestamp': timestamps}
+        ncolumns, offset = get_varint(payload, offset)
+        for c in range(ncolumns):
+            name, offset = get_string(payload, offset)
+            scale, offset = get_varint(payload, offset)
+            bitmap = payload[offset:offset + (count + 7) // 8]
+            offset = offset + len(bitmap)
+            values = []
+            previous = 0
+            for i in range(count):
+                if bitmap[i // 8] & (1 << (i % 8)):
+                    delta, offset = get_svarint(payload, offset)
+                    previous = previous + delta
+                    values.append(previous if scale == 1 else previous / scale)
+                else:
+                    values.append(None)
+            data[name] = values
+        return data
+
+
+CODECS = {
+    FORMAT_JSON   : JsonCodec(),
+    FORMAT_BINARY : BinaryCodec(),
+}
+
+def get_codec(msg_format):
+    return CODECS[msg_format]
+
+def register_codecs(iot_client):
+    # json is already handled by ibmiotf itself
+    for msg_format, codec in CODECS.items():
+        if msg_format != FORMAT_JSON:
+            iot_client.setMessageEncoderModule(msg_format, codec)
+
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+#   Simple IOT demo in Linux
+#   Copyright (C) 2019  Jeune Prime M. Origines <primeyo2004@yahoo.com>
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+# Benchmark of the payload codecs, bytes on wire and encode/decode cost
+#   usage: payloadcodec_bench.py [devices] [readings per batch]
+
+import eventbatcher
+import payloadcodec
+
+import datetime
+import sys
+import time
+
+
+class PahoMessage:
+    def __init__(self, payload):
+        self.payload = payload
+
+def sample_batch(ndevices, nreadings):
+    batch = eventbatcher.EventBatch('DEMOSENSOR_T')
+    start = time.time()
+    for i in range(nreadings):
+        batch.Add('TEMPSENSOR_%d' % (i % ndevices), {'temperature': 21.0 + (i % 13) * 0.1},
+                start + (i // ndevices) * 0.25)
+    return batch.Payload()
+
+def bench_codec(name, data, repeat):
+    codec = payloadcodec.get_codec(name)
+    timestamp = datetime.datetime.now(datetime.timezone.utc)
+
+    start = time.perf_counter()
+    for i in range(repeat):
+        payload = codec.encode(data, timestamp)
+    encode_time = (time.perf_counter() - start) / repeat
+
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    message = PahoMessage(payload)
+    start = time.perf_counter()
+    for i in range(repeat):
+        codec.decode(message)
+    decode_time = (time.perf_counter() - start) / repeat
+
+    print('%-6s bytes=%-8d encode=%9.2fus decode=%9.2fus' %
+            (name, len(payload), encode_time * 1e6, decode_time * 1e6))
+
+
+def main():
+    ndevices  = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    nreadings = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    samples = [('single reading', {'temperature': 23.5}, 10000),
+               ('batch of %d readings from %d devices' % (nreadings, ndevices),
+                sample_batch(ndevices, nreadings), max(1, 100000 // nreadings))]
+    for title, data, repeat in samples:
+        print(title)
+        for name in [payloadcodec.FORMAT_JSON, payloadcodec.FORMAT_BINARY]:
+            bench_codec(name, data, repeat)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+#   Simple IOT demo in Linux
+#   Copyright (C) 2019  Jeune Prime M. Origines <primeyo2004@yahoo.com>
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import time
+
+
+class DeadbandPolicy:
+    # a reading is reported when one of its values moved by more than the
+    # absolute or percent deadband from the last reported one, or when the
+    # device was silent for max_silence seconds (heartbeat), but never more
+    # often than every min_interval seconds
+    def __init__(self, absolute=None, percent=None, max_silence=None, min_interval=0.0):
+        self.Absolute    = absolute
+        self.Percent     = percent
+        self.MaxSilence  = max_silence
+        self.MinInterval = min_interval
+
+    def Exceeded(self, last, value):
+        if last is None or value is None:
+            return last != value
+        delta = abs(value - last)
+        if self.Absolute is None and self.Percent is None:
+            return delta > 0
+        if self.Absolute is not None and delta > self.Absolute:
+            return True
+        if self.Percent is not None and delta > abs(last) * self.Percent / 100:
+            return True
+        return False
+
+
+class ReportByException:
+    # keeps the last reported reading of every device and decides whether a
+    # new reading has to be published, devices without their own policy use
+    # the default one
+    def __init__(self, default_policy, policies=None):
+        self.DefaultPolicy = default_policy
+        self.Policies      = dict(policies) if policies is not None else {}
+        self.Reported      = 0
+        self.Suppressed    = 0
+        self.DeviceSuppressed = {}
+        self.__last        = {}
+
+    def SetPolicy(self, deviceId, policy):
+        self.Policies[deviceId] = policy
+
+    def Policy(self, deviceId):
+        return self.Policies.get(deviceId, self.DefaultPolicy)
+
+    def Check(self, deviceId, data, now=None):
+        # True when the reading is to be published, it then becomes the
+        # reference for the following readings of the device
+        if now is None:
+            now = time.monotonic()
+        policy = self.Policy(deviceId)
+        last   = self.__last.get(deviceId)
+        if last is None:
+            report = True
+        else:
+            lastTime, lastData = last
+            elapsed = now - lastTime
+            if elapsed < policy.MinInterval:
+                report = False
+            elif policy.MaxSilence is not None and elapsed >= policy.MaxSilence:
+                report = True
+            else:
+                report = any(policy.Exceeded(lastData.get(name), value) for name, value in data.items())
+
+        if report:
+            self.__last[deviceId] = (now, dict(data))
+            self.Reported = self.Reported + 1
+        else:
+            self.Suppressed = self.Suppressed + 1
+            self.DeviceSuppressed[deviceId] = self.DeviceSuppressed.get(deviceId, 0) + 1
+        return report
+
+    def Forget(self, deviceId=None):
+        # the next reading of the device is reported regardless of its value
+        if deviceId is None:
+            self.__last.clear()
+        else:
+            self.__last.pop(deviceId, None)
@@ -17,7 +17,95 @@
 #   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
 
+import array
 import smbus
+import statistics
+import time
+
+
+TC74_SAMPLE_BUFFER_SIZE = 256
+TC74_I2C_ADDRESSES      = range(0x48, 0x50)
+
+def to_celsius(raw):
+    # the temperature register is 8 bit two's complement, -65C to +127C
+    raw = raw & 0xff
+    if raw > 127:
+        return raw - 256
+    return raw
+
+
+class TC74SampleBuffer:
+    # preallocated ring buffer of samples and their timestamps, the windows
+    # are returned as memoryview segments of the buffer, oldest first
+    def __init__(self, size=TC74_SAMPLE_BUFFER_SIZE):
+        self.Size  = size
+        self.Count = 0
+        self.__values     = array.array('b', bytes(size))
+        self.__timestamps = array.array('d', bytes(8 * size))
+        self.__valuesView     = memoryview(self.__values)
+        self.__timestampsView = memoryview(self.__timestamps)
+
+    def __len__(self):
+        return min(self.Count, self.Size)
+
+    def Append(self, value, timestamp):
+        index = self.Count % self.Size
+        self.__values[index]     = value
+        self.__timestamps[index] = timestamp
+        self.Count = self.Count + 1
+
+    def __Segments(self, view, n, step):
+        # last n samples of view as at most two segments across the wrap
+        n = len(self) if n is None else min(n, len(self))
+        end   = self.Count % self.Size
+        start = end - n
+        if start >= 0:
+            return [view[start:end:step]] if n > 0 else []
+        head = view[self.Size + start:self.Size:step]
+        skip = (step - (-start) % step) % step
+        return [head, view[skip:end:step]]
+
+    def Values(self, n=None, step=1):
+        return self.__Segments(self.__valuesView, n, step)
+
+    def Timestamps(self, n=None, step=1):
+        return self.__Segments(self.__timestampsView, n, step)
+
+    def Decimated(self, step, n=None):
+        return self.Values(n, step), self.Timestamps(n, step)
+
+    def Min(self, n=None):
+        return min(min(segment) for segment in self.Values(n) if len(segment) > 0)
+
+    def Max(self, n=None):
+        return max(max(segment) for segment in self.Values(n) if len(segment) > 0)
+
+    def Mean(self, n=None):
+        segments = self.Values(n)
+        return sum(sum(segment) for segment in segments) / sum(len(segment) for segment in segments)
+
+    def Median(self, n=None):
+        values = []
+        for segment in self.Values(n):
+            values.extend(segment)
+        return statistics.median(values)
+
+
+class TC74Sampler:
+    # samples the sensor into a ring buffer, Sample() is meant to be used
+    # as main loop timeout callback at the sampling rate
+    def __init__(self, sensor, size=TC74_SAMPLE_BUFFER_SIZE):
+        self.Sensor = sensor
+        self.Buffer = TC74SampleBuffer(size)
+
+    def Sample(self):
+        self.Add(self.Sensor.read(), time.time())
+        return True
+
+    def Add(self, raw, timestamp):
+        # raw register value read elsewhere e.g. by the I2C bus scheduler
+        self.Buffer.Append(to_celsius(raw), timestamp)
+
 
 class TC74Sensor:
     def __init__(self, i2cbus, i2caddr):
@@ -27,29 +115,55 @@ class TC74Sensor:
     def read(self):
         return 0 
 
+class __SMBusDummy:
+    def __init__(self, i2cbus):
+        self.i2cbus = i2cbus
+        self.values = {}
+
+    def write_byte(self, i2caddr, value):
+        self.values.setdefault(i2caddr, i2caddr & 0x07)
+
+    def read_byte(self, i2caddr):
+        value = self.values.get(i2caddr, i2caddr & 0x07)
+        if value > 100:
+            value = 0
+        self.values[i2caddr] = value + 1
+        return value + 1
+
 class __TC74SensorDummy(TC74Sensor):
-    def __init__(self, i2cbus, i2caddr):
+    def __init__(self, i2cbus, i2caddr, bus=None):
         TC74Sensor.__init__(self,i2cbus,i2caddr)
+        self.bus = bus
         self.value = 0
+        if self.bus is not None:
+            self.bus.write_byte(self.i2caddr,0x00)
 
     def read(self):
+        if self.bus is not None:
+            return self.bus.read_byte(self.i2caddr)
         if self.value > 100:
             self.value = 0
         self.value = self.value + 1
         return self.value 
 
 class __TC74SensorImpl(TC74Sensor):
-    def __init__(self, i2cbus, i2caddr):
+    def __init__(self, i2cbus, i2caddr, bus=None):
         TC74Sensor.__init__(self,i2cbus,i2caddr)
-        self.bus = smbus.SMBus(self.i2cbus)
+        self.bus = bus if bus is not None else smbus.SMBus(self.i2cbus)
         self.bus.write_byte(self.i2caddr,0x00)
 
     def read(self):
         return self.bus.read_byte(self.i2caddr)
 
-def create_TC74Sensor(name,i2cbus,i2caddr):
+def create_SMBus(name,i2cbus):
+    # bus handle to be shared by the sensors of the same driver on a bus
     if name == 'TC74SensorImpl':
-        return __TC74SensorImpl(i2cbus,i2caddr)
+        return smbus.SMBus(i2cbus)
     elif name == 'TC74SensorDummy':
-        return __TC74SensorDummy(i2cbus,i2caddr)
+        return __SMBusDummy(i2cbus)
 
+def create_TC74Sensor(name,i2cbus,i2caddr,bus=None):
+    if name == 'TC74SensorImpl':
+        return __TC74SensorImpl(i2cbus,i2caddr,bus)
+    elif name == 'TC74SensorDummy':
+        return __TC74SensorDummy(i2cbus,i2caddr,bus)